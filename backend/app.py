@@ -1,10 +1,24 @@
 # app.py
 import os
+import hmac
+import hashlib
 import json
-from flask import Flask, request, jsonify
+import threading
+import time
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
-from services import get_google_sheet_contacts, send_whatsapp_template, get_groq_response, send_whatsapp_text, send_brevo_email, get_sheet_titles
+from services import iter_google_sheet_contacts, reset_sheets_client, get_groq_response, send_whatsapp_text, get_sheet_titles, validate_image_url, llm_gateway
+from blast import run_blast
+from jobs import submit_job, get_job, list_jobs
+from webhook_queue import enqueue_event, queue_size, WEBHOOK_QUEUE_SIZE
+from dedup import DedupIndex
+from intents import IntentMatcher, load_intents_file, merge_intents
+from llm_cache import reply_cache, semantic_cache
+from memory import conversations
+from checkpoints import start_blast, set_blast_status, get_blast, list_unfinished_blasts
+from logstore import live_logs, LOG_BUFFER_SIZE
+from delivery_status import record_status, blast_report, phone_history
 
 load_dotenv()
 app = Flask(__name__)
@@ -13,7 +27,29 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 
 # Security: The password required to fire the blast
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "default_secret") 
-global_logs = []
+# Print the full raw webhook payloads (very noisy while a blast is running)
+WEBHOOK_DEBUG = os.getenv("WEBHOOK_DEBUG", "").lower() in ("1", "true", "yes")
+
+# IDs of webhook events already processed (Set WEBHOOK_DEDUP_PERSIST=1 to survive restarts)
+processed_events = DedupIndex(
+    "webhook",
+    ttl=int(os.getenv("WEBHOOK_DEDUP_TTL", "86400")),
+    max_size=int(os.getenv("WEBHOOK_DEDUP_SIZE", "100000")),
+    persist=os.getenv("WEBHOOK_DEDUP_PERSIST", "").lower() in ("1", "true", "yes"),
+)
+# Live dashboard logs (blast progress, send results, async delivery failures) are kept in logstore.live_logs
+# Live log stream (Server-Sent Events)
+SSE_HEARTBEAT = 15  # Seconds between keep-alive comments on an idle stream
+SSE_MAX_SECONDS = int(os.getenv("SSE_MAX_SECONDS", "300"))  # Then the browser reconnects (Last-Event-ID)
+SSE_RETRY_MS = 2000  # Browser reconnect delay
+# Every open stream holds a server thread: at most this many at once, so dashboards
+# can't take the threads /webhook needs (gunicorn.conf.py adds WEB_THREADS on top)
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", "2"))
+_stream_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+# The logs contain every recipient, so reading them needs a token (?token=...). It is
+# handed out with the blast (or by /api/log-token) and signed with ADMIN_PASSWORD, so
+# the password itself never ends up in a URL.
+LOG_TOKEN_TTL = int(os.getenv("LOG_TOKEN_TTL", "43200"))  # 12 hours
 # --- STATIC RESPONSE CONFIGURATION ---
 
 # 1. GREETINGS
@@ -132,17 +168,119 @@ We look forward to working with you. If you have any more questions, just ask!
 *Team Shout OTB*
 📞 +91 9752000546"""
 
+# --- INTENT TABLE (Priority order: first match wins) ---
+# Extra intents / languages can be added without code changes via a JSON file
+# (INTENTS_FILE, same fields). An entry with the same name replaces the built-in one
+# and keeps its priority.
+INTENTS = [
+    {"name": "greeting", "keywords": GREETING_KEYWORDS, "reply": STATIC_GREETING, "exact": True},
+    {"name": "pricing", "keywords": PRICING_KEYWORDS, "reply": STATIC_PRICING},
+    {"name": "location", "keywords": LOCATION_KEYWORDS, "reply": STATIC_LOCATION},
+    {"name": "services", "keywords": SERVICES_KEYWORDS, "reply": STATIC_SERVICES},
+    {"name": "thanks", "keywords": THANKS_KEYWORDS, "reply": STATIC_THANKS},
+]
+INTENTS = merge_intents(INTENTS, load_intents_file(os.getenv("INTENTS_FILE", "intents.json")))
+
+# Compiled once at startup, classifies a message in a single pass
+intent_matcher = IntentMatcher(INTENTS)
+
 @app.route("/")
 def home():
-    return jsonify({"status": "Backend is running", "platform": "Render"}), 200
+    return jsonify({
+        "status": "Backend is running",
+        "platform": "Render",
+        # Webhook events waiting for a worker (deliveries are refused once the queue is full)
+        "webhook_queue": {"waiting": queue_size(), "capacity": WEBHOOK_QUEUE_SIZE},
+    }), 200
+
+def issue_log_token():
+    expires = int(time.time()) + LOG_TOKEN_TTL
+    return f"{expires}.{_sign_log_token(expires)}"
+
+def is_valid_log_token(token):
+    expires, _, signature = (token or "").partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _sign_log_token(int(expires)))
+
+def _sign_log_token(expires):
+    return hmac.new(ADMIN_PASSWORD.encode(), f"logs:{expires}".encode(), hashlib.sha256).hexdigest()
+
+@app.route("/api/log-token", methods=["POST"])
+def log_token():
+    """
+    Token for /api/stream-logs and /api/get-live-logs (e.g. to follow a blast started elsewhere).
+    """
+    data = request.json or {}
+    if data.get("password") != ADMIN_PASSWORD:
+        return jsonify({"error": "Wrong Password"}), 403
+    return jsonify({"log_token": issue_log_token(), "log_cursor": live_logs.latest_seq()}), 200
 
 @app.route("/api/get-live-logs", methods=["GET"])
 def get_live_logs():
-    global global_logs
-    # Return the logs and CLEAR them (so we don't print duplicates)
-    logs_to_return = list(global_logs)
-    global_logs.clear()
-    return jsonify({"logs": logs_to_return}), 200
+    """
+    Returns the log events newer than ?cursor=N (the "cursor" of the previous answer).
+    Nothing is cleared, so several dashboards can follow the logs at the same time.
+    Needs ?token= (see /api/log-token).
+    """
+    if not is_valid_log_token(request.args.get("token")):
+        return jsonify({"error": "Invalid or expired log token"}), 403
+    cursor = request.args.get("cursor", "0")
+    limit = request.args.get("limit", "500")
+    if not cursor.isdigit() or not limit.isdigit() or int(limit) < 1:
+        return jsonify({"error": "cursor must be a whole number and limit a positive one"}), 400
+    logs, next_cursor, dropped = live_logs.read(int(cursor), min(int(limit), LOG_BUFFER_SIZE))
+    return jsonify({"logs": logs, "cursor": next_cursor, "dropped": dropped}), 200
+
+@app.route("/api/stream-logs", methods=["GET"])
+def stream_logs():
+    """
+    Server-Sent Events: pushes every log event (blast progress, per-recipient results,
+    async delivery failures) as soon as it happens. Starts after ?cursor=N; when the
+    browser reconnects it sends Last-Event-ID and the stream resumes from there.
+    Needs ?token= (see /api/log-token).
+    Every open stream holds one server thread (see the gunicorn note in jobs.py), so
+    only SSE_MAX_STREAMS can be open at once (503 otherwise) and streams end after
+    SSE_MAX_SECONDS (the browser reconnects by itself).
+    """
+    if not is_valid_log_token(request.args.get("token")):
+        return jsonify({"error": "Invalid or expired log token"}), 403
+    if not _stream_slots.acquire(blocking=False):
+        return jsonify({"error": f"Too many open log streams (max {SSE_MAX_STREAMS})"}), 503
+
+    cursor = request.headers.get("Last-Event-ID", type=int)
+    if cursor is None:
+        cursor = request.args.get("cursor", default=0, type=int)
+
+    def events(cursor):
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while time.monotonic() < deadline:
+            logs, cursor, dropped = live_logs.read(cursor, 500)
+            if dropped:
+                yield f"data: {json.dumps({'type': 'dropped', 'dropped': dropped})}\n\n"
+            for entry in logs:
+                yield f"id: {entry['seq']}\ndata: {json.dumps(entry)}\n\n"
+            if not logs and not live_logs.wait(cursor, SSE_HEARTBEAT):
+                # Comment line: keeps proxies from closing an idle connection
+                yield ": ping\n\n"
+
+    response = Response(events(cursor), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # Don't let a proxy buffer the stream
+    })
+    # Runs when the stream ends or the browser disconnects
+    response.call_on_close(_stream_slots.release)
+    return response
+
+@app.route("/api/llm-stats", methods=["GET"])
+def llm_stats():
+    return jsonify({
+        "reply_cache": reply_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "active_chats": conversations.active_sessions(),
+        "gateway": llm_gateway.stats(),
+    }), 200
 
 @app.route("/api/get-sheet-names", methods=["GET"])
 def get_sheets():
@@ -177,97 +315,141 @@ def send_blast():
     if not send_whatsapp_flag and not send_email_flag:
         return jsonify({"error": "Please select at least one sending method."}), 400
 
-    # 2. GET CONTACTS (This returns duplicates if they have different emails, which is GOOD)
-    contacts = get_google_sheet_contacts(sheet_url, selected_tabs)
-    if not contacts:
-        return jsonify({"error": "Sheet error or empty"}), 500
+    # Quick answer for the dashboard (cached, so the job's own pre-flight is a cache hit)
+    if send_whatsapp_flag and image_url and not validate_image_url(image_url):
+        return jsonify({"error": f"Image URL is not publicly accessible: {image_url}"}), 400
+
+    # 2. QUEUE THE BLAST (Reading the sheet + sending happens in the background runner)
+    job = submit_job({
+        "sheet_url": sheet_url,
+        "selected_tabs": selected_tabs,
+        "message": message_body,
+        "image_url": image_url,
+        "send_whatsapp": send_whatsapp_flag,
+        "send_email": send_email_flag,
+    }, execute_blast)
 
-    # 3. SEND LOOP
-    stats = {"whatsapp_sent": 0, "whatsapp_fail": 0, "email_sent": 0, "email_fail": 0}
-    
-    # --- NEW: DUPLICATE PROTECTION SETS ---
-    sent_phones = set()
-    sent_emails = set()
-    
-    print(f"Starting blast... WA: {send_whatsapp_flag}, Email: {send_email_flag}")
-    
-    for row in contacts:
-        # --- CLEAN NAME ---
-        raw_name = str(row.get('Name', 'Valued Customer')).strip()
-        clean_name = raw_name.split('-')[0].split('|')[0].strip() or "Valued Customer"
-
-        # --- OPTION 1: WHATSAPP ---
-        if send_whatsapp_flag:
-            raw_phone = str(row.get('Phone', '')).strip()
-            phone = raw_phone.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
-            if phone.startswith('0'): phone = phone[1:]
-            
-            if phone and not phone.startswith('011') and len(phone) >= 10:
-                if not phone.startswith('91') and not phone.startswith('+'):
-                    phone = "91" + phone
-
-                # CHECK DUPLICATES
-                if phone in sent_phones:
-                    print(f"⏭️ WA Skip: {phone} (Already sent successfully)")
-                else:
-                    # Capture the full response
-                    status_code, response_data = send_whatsapp_template(phone, clean_name, message_body, image_url)
-                    
-                    if status_code in [200, 201]:
-                        stats["whatsapp_sent"] += 1
-                        sent_phones.add(phone) # Mark as success
-                        print(f"✅ WA Sent: {phone}")
-                    else:
-                        stats["whatsapp_fail"] += 1
-                        # --- NEW: PRINT THE ACTUAL ERROR ---
-                        error_msg = response_data.get('error', {}).get('message', 'Unknown Error')
-                        print(f"❌ WA Failed for {phone}: {error_msg}")
-
-        # --- OPTION 2: EMAIL ---
-        if send_email_flag:
-            # 1. Get raw data
-            raw_email = str(row.get('Email ids', ''))
-            
-            # 2. Aggressive Cleaning
-            # Remove invisible characters (Newlines, Tabs, Non-breaking spaces)
-            email = raw_email.replace('\r', '').replace('\n', '').replace('\t', '').replace('\xa0', '').strip()
-            
-            # 3. Handle multiple emails in one cell (e.g., "test@gmail.com, boss@gmail.com")
-            if ',' in email: 
-                email = email.split(',')[0].strip()
-            elif '/' in email: # Handle "email1 / email2"
-                email = email.split('/')[0].strip()
-            
-            # 4. Handle "email@gmail.com (Personal)" format
-            if ' ' in email: 
-                email = email.split(' ')[0].strip()
-
-            # 5. Final Validation before sending
-            if email and '@' in email and '.' in email:
-                
-                # Check duplicates
-                if email in sent_emails:
-                    print(f"⏭️ Email Skip: {email} (Already sent)")
-                else:
-                    # Send
-                    subject = f"Update for {clean_name}"
-                    if send_brevo_email(email, subject, message_body, clean_name):
-                        stats["email_sent"] += 1
-                        sent_emails.add(email) # Mark as sent
-                        print(f"✅ Email Sent: {email}")
-                    else:
-                        stats["email_fail"] += 1
-                        print(f"❌ Email Failed: {email}")
-            else:
-                # Print why it was skipped (helps debugging)
-                if raw_email:
-                    print(f"⚠️ Invalid Email Format: '{raw_email}' -> Cleaned: '{email}'")
-    
     return jsonify({
-        "status": "completed",
-        "total_rows": len(contacts),
-        "stats": stats
-    }), 200
+        "status": "queued",
+        "job_id": job.job_id,
+        "log_cursor": live_logs.latest_seq(),  # Follow /api/stream-logs from here
+        "log_token": issue_log_token(),
+    }), 202
+
+def execute_blast(job):
+    """
+    Runs inside the background job runner (see jobs.py).
+    """
+    params = job.params
+    start_blast(job.job_id, params)  # Checkpoint store (so the blast can be resumed)
+
+    # Pre-flight: check the image once for the whole blast (new or resumed) instead of
+    # failing every single row later. The senders trust this check.
+    if params["send_whatsapp"] and params["image_url"] and not validate_image_url(params["image_url"]):
+        set_blast_status(job.job_id, "failed")
+        raise RuntimeError(f"Image URL is not publicly accessible: {params['image_url']}")
+
+    # STREAM CONTACTS (Tab by tab, sending starts as soon as the first tab is read)
+    # This returns duplicates if they have different emails, which is GOOD
+    contacts = iter_google_sheet_contacts(params["sheet_url"], params["selected_tabs"], on_tab_loaded=job.tab_loaded)
+
+    # SEND (one worker pool per channel, see blast.py)
+    print(f"Starting blast... WA: {params['send_whatsapp']}, Email: {params['send_email']}")
+    try:
+        run_blast(contacts, params["message"], params["image_url"], params["send_whatsapp"], params["send_email"],
+                  stats=job.stats, on_row=job.row_done, blast_id=job.job_id, on_result=_recipient_logger(job))
+    except Exception:
+        reset_sheets_client()
+        set_blast_status(job.job_id, "failed")
+        raise
+
+    if job.rows_processed == 0:
+        set_blast_status(job.job_id, "failed")
+        raise RuntimeError("Sheet error or empty")
+    set_blast_status(job.job_id, "completed")
+
+def _recipient_logger(job):
+    """
+    Publishes every send result of a blast to the live logs (see /api/stream-logs).
+    """
+    def on_result(channel, recipient, ok, error_msg):
+        label = "WA" if channel == "whatsapp" else "Email"
+        if ok:
+            message = f"✅ {label} Sent: {recipient}"
+        else:
+            message = f"❌ {label} Failed for {recipient}: {error_msg or 'Unknown Error'}"
+        live_logs.append("recipient_result", message, level="info" if ok else "error",
+                         blast_id=job.job_id, channel=channel, recipient=recipient, ok=ok)
+        job.progress_changed()
+    return on_result
+
+@app.route("/api/resume-blast", methods=["POST"])
+def resume_blast():
+    """
+    Continues an interrupted blast from its checkpoint (already-sent recipients are skipped).
+    """
+    data = request.json
+    if data.get("password") != ADMIN_PASSWORD:
+        return jsonify({"error": "Wrong Password"}), 403
+
+    blast = get_blast(data.get("job_id", ""))
+    if not blast:
+        return jsonify({"error": "Unknown job ID"}), 404
+    if blast["status"] == "completed":
+        return jsonify({"error": "This blast already completed"}), 400
+
+    job = submit_job(blast["params"], execute_blast, job_id=blast["blast_id"])
+    if not job:
+        return jsonify({"error": "This blast is still running"}), 409
+
+    return jsonify({
+        "status": "queued",
+        "job_id": job.job_id,
+        "log_cursor": live_logs.latest_seq(),  # Follow /api/stream-logs from here
+        "log_token": issue_log_token(),
+    }), 202
+
+@app.route("/api/resumable-blasts", methods=["GET"])
+def resumable_blasts():
+    # Jobs still queued/running in this process can't be resumed yet
+    active = {job.job_id for job in list_jobs() if job.status in ("queued", "running")}
+    return jsonify({"blasts": [b for b in list_unfinished_blasts() if b["blast_id"] not in active]}), 200
+
+@app.route("/api/blast-status/<job_id>", methods=["GET"])
+def blast_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job ID"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route("/api/blast-report/<blast_id>", methods=["POST"])
+def blast_delivery_report(blast_id):
+    """
+    Real delivery numbers of a blast's WhatsApp messages (from the webhook status callbacks).
+    Updates are written in batches, so the numbers can be up to STATUS_FLUSH_INTERVAL behind.
+    Emails are not in here: their only numbers are the job stats, and a batched email
+    that failed with a server error / timeout counts as failed for its whole batch
+    (see services.send_brevo_email_batch).
+    """
+    data = request.json or {}
+    if data.get("password") != ADMIN_PASSWORD:
+        return jsonify({"error": "Wrong Password"}), 403
+
+    report = blast_report(blast_id)
+    if not report:
+        return jsonify({"error": "No WhatsApp messages recorded for this blast"}), 404
+    return jsonify(report), 200
+
+@app.route("/api/phone-status/<phone>", methods=["POST"])
+def phone_delivery_status(phone):
+    data = request.json or {}
+    if data.get("password") != ADMIN_PASSWORD:
+        return jsonify({"error": "Wrong Password"}), 403
+    return jsonify({"phone": phone, "messages": phone_history(phone)}), 200
+
+@app.route("/api/blasts", methods=["GET"])
+def blasts():
+    return jsonify({"jobs": [job.to_dict() for job in list_jobs()]}), 200
 
 # Webhook for Replies (We will build this out later)
 @app.route("/webhook", methods=["GET", "POST"])
@@ -281,77 +463,118 @@ def webhook():
             return challenge, 200
         return "Forbidden", 403
 
-    # 2. INCOMING MESSAGES
+    # 2. INCOMING MESSAGES (Acknowledge right away, process in the background)
     if request.method == "POST":
-        data = request.get_json()
-        
-        # --- DEBUG PRINT: Show exactly what Meta sent ---
-        print("📨 WEBHOOK RAW DATA:", json.dumps(data, indent=2)) 
+        data = request.get_json(silent=True)
+
+        if not isinstance(data, dict) or data.get("object") != "whatsapp_business_account" \
+                or not isinstance(data.get("entry"), list):
+            return jsonify({"error": "Invalid payload"}), 400
 
-        try:
-            if data.get("entry") and data["entry"][0].get("changes"):
-                change = data["entry"][0]["changes"][0]["value"]
-                
-            # --- CASE A: STATUS UPDATE ---
-            if "statuses" in change:
-                status_data = change["statuses"][0]
-                phone = status_data.get("recipient_id")
-                status = status_data.get("status")
-
-                if status == "failed":
-                    errors = status_data.get("errors", [])
-                    error_msg = errors[0].get('message') if errors else "Unknown Error"
-                    error_code = errors[0].get('code') if errors else "000"
-
-                    # FORMAT THE LOG MESSAGE
-                    log_entry = f"🚫 FAILED (Async): {phone} | Error {error_code}: {error_msg}"
-
-                    # SAVE TO GLOBAL LIST
-                    global_logs.append(log_entry)
-
-                    print(f"❌ LOG SAVED: {log_entry}")
-
-                # --- CASE B: INCOMING MESSAGE (Replies) ---
-                elif "messages" in change:
-                    message_data = change["messages"][0]
-                    phone_no = message_data["from"]
-                    
-                    # Handle Button Clicks & Text
-                    message_type = message_data["type"]
-                    user_text = ""
-
-                    if message_type == "text":
-                        user_text = message_data["text"]["body"]
-                    elif message_type == "button":
-                        user_text = message_data["button"]["text"]
-                        print(f"🔘 Button Click: {user_text}")
-                    elif message_type == "interactive":
-                         if message_data["interactive"]["type"] == "button_reply":
-                            user_text = message_data["interactive"]["button_reply"]["title"]
-
-                    if user_text:
-                        clean_text = user_text.lower().strip()
-                        
-                        # --- STATIC RESPONSES ---
-                        if clean_text in GREETING_KEYWORDS:
-                             send_whatsapp_text(phone_no, STATIC_GREETING)
-                        elif any(word in clean_text for word in PRICING_KEYWORDS):
-                             send_whatsapp_text(phone_no, STATIC_PRICING)
-                        elif any(word in clean_text for word in LOCATION_KEYWORDS):
-                             send_whatsapp_text(phone_no, STATIC_LOCATION)
-                        elif any(word in clean_text for word in SERVICES_KEYWORDS):
-                             print(f"🚀 Services query from {phone_no}")
-                             send_whatsapp_text(phone_no, STATIC_SERVICES)
-                        elif any(word in clean_text for word in THANKS_KEYWORDS):
-                             send_whatsapp_text(phone_no, STATIC_THANKS)
-                        else:
-                             ai_reply = get_groq_response(user_text)
-                             send_whatsapp_text(phone_no, ai_reply)
-
-        except Exception as e:
-            print(f"Webhook Error: {e}")
+        if not enqueue_event(data, process_webhook):
+            # Queue is full: a non-200 makes Meta redeliver later
+            return jsonify({"status": "busy"}), 503
 
         return jsonify({"status": "received"}), 200
+
+def process_webhook(data):
+    """
+    Runs on a webhook worker thread (see webhook_queue.py).
+    Meta batches many events into one POST, so every entry / change / status / message is handled.
+    """
+    # --- DEBUG PRINT: Show exactly what Meta sent (Set WEBHOOK_DEBUG=1, very noisy during blasts) ---
+    if WEBHOOK_DEBUG:
+        print("📨 WEBHOOK RAW DATA:", json.dumps(data, indent=2)) 
+
+    statuses, messages = extract_webhook_events(data)
+
+    # Drop events we already processed (Meta redelivers on timeouts / errors).
+    # A status ID repeats for sent -> delivered -> read, so the status is part of the key.
+    statuses = [s for s in statuses if processed_events.add_if_new(f"status:{s.get('id')}:{s.get('status')}")]
+    messages = [m for m in messages if processed_events.add_if_new(f"message:{m.get('id')}")]
+    print(f"📨 Webhook: {len(statuses)} new status update(s), {len(messages)} new message(s)")
+
+    if statuses:
+        handle_statuses(statuses)
+
+    # Each message is its own task, so replies to different users run in parallel.
+    # Keyed by sender: one user's messages are answered one at a time, in order.
+    for message_data in messages:
+        if not enqueue_event(message_data, handle_message, key=message_data.get("from")):
+            handle_message(message_data)
+
+def extract_webhook_events(data):
+    """
+    Collects the statuses and messages of every entry and change in a webhook payload.
+    """
+    statuses = []
+    messages = []
+    for entry in data.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            statuses.extend(value.get("statuses") or [])
+            messages.extend(value.get("messages") or [])
+    return statuses, messages
+
+def handle_statuses(statuses):
+    """
+    CASE A: STATUS UPDATES (sent / delivered / read / failed), handled as one batch.
+    Every status goes to the delivery status store (see /api/blast-report),
+    failures are also shown on the dashboard.
+    """
+    for status_data in statuses:
+        phone = status_data.get("recipient_id")
+        if status_data.get("status") != "failed":
+            record_status(status_data.get("id"), status_data.get("status"), phone)
+            continue
+
+        errors = status_data.get("errors", [])
+        error_msg = errors[0].get('message') if errors else "Unknown Error"
+        error_code = errors[0].get('code') if errors else "000"
+        record_status(status_data.get("id"), "failed", phone, error_code, error_msg)
+
+        # FORMAT THE LOG MESSAGE + SAVE IT FOR THE DASHBOARD
+        log_entry = live_logs.append(
+            "delivery_failed",
+            f"🚫 FAILED (Async): {phone} | Error {error_code}: {error_msg}",
+            level="error",
+            phone=phone,
+            code=error_code,
+            wamid=status_data.get("id"),
+        )
+        print(f"❌ LOG SAVED: {log_entry['message']}")
+
+def handle_message(message_data):
+    """
+    CASE B: INCOMING MESSAGE (Replies)
+    """
+    phone_no = message_data["from"]
+            
+    # Handle Button Clicks & Text
+    message_type = message_data["type"]
+    user_text = ""
+
+    if message_type == "text":
+        user_text = message_data["text"]["body"]
+    elif message_type == "button":
+        user_text = message_data["button"]["text"]
+        print(f"🔘 Button Click: {user_text}")
+    elif message_type == "interactive":
+         if message_data["interactive"]["type"] == "button_reply":
+            user_text = message_data["interactive"]["button_reply"]["title"]
+
+    if user_text:
+        # --- STATIC RESPONSES ---
+        intent = intent_matcher.match(user_text)
+        if intent:
+            if intent["name"] == "services":
+                print(f"🚀 Services query from {phone_no}")
+            send_whatsapp_text(phone_no, intent["reply"])
+            # Remembered, so a follow-up question to the LLM has the context
+            conversations.add_turn(phone_no, user_text, intent["reply"], static=True)
+        else:
+            ai_reply = get_groq_response(user_text, phone_no)
+            send_whatsapp_text(phone_no, ai_reply)
     
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
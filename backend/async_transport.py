@@ -0,0 +1,74 @@
+# async_transport.py
+import asyncio
+import os
+import threading
+from urllib.parse import urlsplit
+import httpx
+from connections import DEFAULT_TIMEOUT
+
+# --- CONFIGURATION ---
+# "sync"  = requests + one worker thread per in-flight message (default)
+# "async" = every provider call runs on one shared asyncio event loop (httpx),
+#           so hundreds of messages can be in flight without hundreds of threads
+TRANSPORT_MODE = os.getenv("TRANSPORT_MODE", "sync").lower()
+ASYNC_TRANSPORT = TRANSPORT_MODE == "async"
+
+# Messages each blast channel keeps in flight on the event loop (async mode)
+ASYNC_CONCURRENCY = int(os.getenv("ASYNC_CONCURRENCY", "200"))
+# Keep-alive connections per host
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "100"))
+
+_loop = None
+_loop_lock = threading.Lock()
+_clients = {}  # host -> httpx.AsyncClient (only touched from the loop thread)
+
+
+def get_loop():
+    """
+    Returns the process-wide event loop, started on a daemon thread on first use.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-transport", daemon=True).start()
+            print(f"⚡ Async transport started (up to {ASYNC_CONCURRENCY} messages in flight per channel)")
+        return _loop
+
+def submit(coro):
+    """
+    Schedules a coroutine on the event loop from any thread. Returns a concurrent.futures.Future.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+def run_sync(coro):
+    """
+    Runs a coroutine on the event loop and blocks the calling thread until it is done.
+    Never call this from the loop itself (it would wait for itself forever).
+    """
+    return submit(coro).result()
+
+
+def _get_client(host):
+    client = _clients.get(host)
+    if client is None:
+        connect_timeout, read_timeout = DEFAULT_TIMEOUT
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+            ),
+        )
+        _clients[host] = client
+    return client
+
+async def request(method, url, **kwargs):
+    """
+    Same call shape as connections.request(), but awaitable. Responses have the
+    requests-like API the callers use (status_code, headers, json(), text).
+    """
+    return await _get_client(urlsplit(url).netloc).request(method, url, **kwargs)
+
+async def post(url, **kwargs):
+    return await request("POST", url, **kwargs)
@@ -0,0 +1,311 @@
+# blast.py
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import async_transport
+from async_transport import ASYNC_TRANSPORT, ASYNC_CONCURRENCY
+from services import (
+    send_whatsapp_template, send_brevo_email, send_whatsapp_template_async, send_brevo_email_async,
+    send_brevo_email_batch, send_brevo_email_batch_async, BREVO_BATCH_SIZE,
+)
+from checkpoints import load_sent, mark_sent
+from delivery_status import record_sent
+
+# --- CONFIGURATION ---
+# How many messages each channel keeps in flight at the same time
+WHATSAPP_WORKERS = int(os.getenv("WHATSAPP_WORKERS", "16"))
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "8"))
+EMAIL_SUBJECT = "Update for {user_name}"
+
+
+class ChannelPool:
+    """
+    Sends one channel (WhatsApp or Email) through a bounded pool of worker threads.
+
+    Duplicate protection works exactly like the old one-by-one loop:
+    - A phone/email that was already sent successfully is skipped.
+    - While a phone/email is in flight, later rows with the same key wait behind it.
+      If the send fails, the next waiting row gets a turn (just like a retry).
+
+    With a blast_id, every success is checkpointed (see checkpoints.py) and the
+    recipients of an earlier, interrupted run of the same blast are skipped.
+
+    With an async_send_func (TRANSPORT_MODE=async) there are no worker threads: every
+    send is a coroutine on the async transport's event loop and `workers` is the
+    number of messages kept in flight.
+    """
+
+    def __init__(self, name, label, send_func, workers, stats, lock, blast_id=None, async_send_func=None, on_result=None):
+        self.name = name  # "whatsapp" / "email" (prefix of the stats keys)
+        self.label = label  # Short name used in the console logs
+        self.send_func = send_func  # send_func(key, job) -> (ok, error_msg)
+        self.async_send_func = async_send_func  # Same, but awaitable
+        self.on_result = on_result  # on_result(channel, recipient, ok, error_msg) after every send
+        self.stats = stats
+        self.lock = lock  # Shared by all channels of a blast, guards stats + sets
+
+        self.blast_id = blast_id
+        self.sent = load_sent(blast_id, name) if blast_id else set()
+        if self.sent:
+            print(f"♻️ {label} Resume: {len(self.sent)} recipients already sent, skipping them")
+        self.in_flight = {}  # key -> list of waiting jobs for the same key
+
+        if async_send_func:
+            self.executor = None
+            self.capacity = workers
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"blast-{name}")
+            # Back-pressure: never queue more than a few rounds ahead of the workers
+            self.capacity = workers * 4
+        self.slots = threading.BoundedSemaphore(self.capacity)
+
+    def submit(self, key, job):
+        if self._claim(key, job):
+            self._dispatch(self._run, self._run_async, key, job)
+
+    def _claim(self, key, job):
+        """Returns True if the job should be sent now (False = skipped or waiting behind the same key)."""
+        with self.lock:
+            if key in self.sent:
+                print(f"⏭️ {self.label} Skip: {key} (Already sent successfully)")
+                return False
+            if key in self.in_flight:
+                self.in_flight[key].append(job)
+                return False
+            self.in_flight[key] = []
+            return True
+
+    def _dispatch(self, run, run_async, *args):
+        self.slots.acquire()
+        if self.executor:
+            self.executor.submit(run, *args)
+        else:
+            async_transport.submit(run_async(*args))
+
+    def _run(self, key, job):
+        try:
+            while job is not None:
+                try:
+                    ok, error_msg = self.send_func(key, job)
+                except Exception as e:
+                    ok, error_msg = False, str(e)
+                job = self._finish(key, ok, error_msg)
+        finally:
+            self.slots.release()
+
+    async def _run_async(self, key, job):
+        try:
+            while job is not None:
+                try:
+                    ok, error_msg = await self.async_send_func(key, job)
+                except Exception as e:
+                    ok, error_msg = False, str(e)
+                # The checkpoint write (SQLite) must not stall the event loop
+                job = await asyncio.to_thread(self._finish, key, ok, error_msg)
+        finally:
+            self.slots.release()
+
+    def _finish(self, key, ok, error_msg):
+        """Updates stats and returns the next waiting job for this key (or None)."""
+        with self.lock:
+            if ok:
+                self.stats[f"{self.name}_sent"] += 1
+                self.sent.add(key)
+                skipped = self.in_flight.pop(key)
+                next_job = None
+            else:
+                self.stats[f"{self.name}_fail"] += 1
+                skipped = []
+                waiting = self.in_flight[key]
+                next_job = waiting.pop(0) if waiting else None
+                if next_job is None:
+                    del self.in_flight[key]
+
+        if ok:
+            if self.blast_id:
+                mark_sent(self.blast_id, self.name, key)
+            print(f"✅ {self.label} Sent: {key}")
+            for _ in skipped:
+                print(f"⏭️ {self.label} Skip: {key} (Already sent successfully)")
+        elif error_msg:
+            print(f"❌ {self.label} Failed for {key}: {error_msg}")
+        else:
+            print(f"❌ {self.label} Failed: {key}")
+        if self.on_result:
+            self.on_result(self.name, key, ok, error_msg)
+        return next_job
+
+    def close(self):
+        """Waits for every queued send of this channel to finish."""
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            return
+        # Every slot back = nothing left in flight
+        for _ in range(self.capacity):
+            self.slots.acquire()
+
+
+class BatchChannelPool(ChannelPool):
+    """
+    ChannelPool for providers that accept many recipients per API call (Brevo).
+
+    Claimed recipients are buffered and sent batch_size at a time; each worker slot
+    is one batch in flight. Duplicate protection is the same as ChannelPool: a failed
+    recipient's next waiting row goes out in a follow-up batch.
+    """
+
+    def __init__(self, name, label, send_batch_func, batch_size, workers, stats, lock, blast_id=None, async_send_batch_func=None, on_result=None):
+        # send_batch_func([(key, job), ...]) -> [(ok, error_msg), ...] in the same order
+        super().__init__(name, label, None, workers, stats, lock, blast_id, async_send_func=async_send_batch_func, on_result=on_result)
+        self.send_batch_func = send_batch_func
+        self.batch_size = batch_size
+        self.batch = []  # Only touched by the thread feeding submit()
+
+    def submit(self, key, job):
+        if self._claim(key, job):
+            self.batch.append((key, job))
+            if len(self.batch) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if self.batch:
+            batch, self.batch = self.batch, []
+            self._dispatch(self._run_batch, self._run_batch_async, batch)
+
+    def _finish_batch(self, items, results):
+        """Finishes every item and returns the follow-up batch of waiting jobs."""
+        retry = []
+        for (key, _), (ok, error_msg) in zip(items, results):
+            next_job = self._finish(key, ok, error_msg)
+            if next_job is not None:
+                retry.append((key, next_job))
+        return retry
+
+    def _run_batch(self, items):
+        try:
+            while items:
+                try:
+                    results = self.send_batch_func(items)
+                except Exception as e:
+                    results = [(False, str(e))] * len(items)
+                items = self._finish_batch(items, results)
+        finally:
+            self.slots.release()
+
+    async def _run_batch_async(self, items):
+        try:
+            while items:
+                try:
+                    results = await self.async_send_func(items)
+                except Exception as e:
+                    results = [(False, str(e))] * len(items)
+                items = await asyncio.to_thread(self._finish_batch, items, results)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        self._flush()
+        super().close()
+
+
+# --- CHANNEL SENDERS ---
+
+def _send_whatsapp(phone, job):
+    name, message_body, image_url, blast_id = job
+    status_code, response_data = send_whatsapp_template(phone, name, message_body, image_url, image_checked=True)
+    return _whatsapp_result(phone, blast_id, status_code, response_data)
+
+def _whatsapp_result(phone, blast_id, status_code, response_data):
+    if status_code in [200, 201]:
+        # The message ID links the webhook status callbacks back to this blast
+        messages = response_data.get("messages") if isinstance(response_data, dict) else None
+        if messages and messages[0].get("id"):
+            record_sent(messages[0]["id"], blast_id, phone)
+        return True, None
+    if isinstance(response_data, dict):
+        return False, response_data.get('error', {}).get('message', 'Unknown Error')
+    return False, str(response_data)
+
+def _send_email(email, job):
+    name, message_body = job
+    return send_brevo_email(email, EMAIL_SUBJECT.format(user_name=name), message_body, name), None
+
+def _email_batch(items):
+    # Every row of a blast has the same message, only the name changes
+    recipients = [(email, name) for email, (name, _) in items]
+    return recipients, EMAIL_SUBJECT, items[0][1][1]
+
+def _send_email_batch(items):
+    return [(ok, None) for ok in send_brevo_email_batch(*_email_batch(items))]
+
+async def _send_email_batch_async(items):
+    return [(ok, None) for ok in await send_brevo_email_batch_async(*_email_batch(items))]
+
+async def _send_whatsapp_async(phone, job):
+    name, message_body, image_url, blast_id = job
+    status_code, response_data = await send_whatsapp_template_async(phone, name, message_body, image_url, image_checked=True)
+    return _whatsapp_result(phone, blast_id, status_code, response_data)
+
+async def _send_email_async(email, job):
+    name, message_body = job
+    return await send_brevo_email_async(email, EMAIL_SUBJECT.format(user_name=name), message_body, name), None
+
+
+def run_blast(contacts, message_body, image_url, send_whatsapp_flag, send_email_flag, stats=None, on_row=None, blast_id=None, on_result=None):
+    """
+    Sends the blast to every contact using one worker pool per channel.
+    contacts are normalize.Recipient rows (the send plan), as a list or a stream
+    (rows are sent while later ones are still being read).
+    image_url must already be checked with services.validate_image_url: it is not
+    re-checked per recipient.
+    Returns the stats dict once every message has been sent (or failed).
+    - stats: optional dict to update live (e.g. a BlastJob's stats).
+    - on_row: optional callback, called after each row has been queued.
+    - blast_id: optional, enables checkpointing so the blast can be resumed.
+    - on_result: optional callback(channel, recipient, ok, error_msg), called after every send.
+    """
+    if stats is None:
+        stats = {"whatsapp_sent": 0, "whatsapp_fail": 0, "email_sent": 0, "email_fail": 0}
+    lock = threading.Lock()
+
+    pools = []
+    whatsapp_pool = email_pool = None
+    if send_whatsapp_flag:
+        if ASYNC_TRANSPORT:
+            whatsapp_pool = ChannelPool("whatsapp", "WA", _send_whatsapp, ASYNC_CONCURRENCY, stats, lock, blast_id,
+                                        async_send_func=_send_whatsapp_async, on_result=on_result)
+        else:
+            whatsapp_pool = ChannelPool("whatsapp", "WA", _send_whatsapp, WHATSAPP_WORKERS, stats, lock, blast_id,
+                                        on_result=on_result)
+        pools.append(whatsapp_pool)
+    if send_email_flag and BREVO_BATCH_SIZE > 1:
+        # Workers = batches in flight, in both transport modes
+        email_pool = BatchChannelPool("email", "Email", _send_email_batch, BREVO_BATCH_SIZE, EMAIL_WORKERS, stats, lock, blast_id,
+                                      async_send_batch_func=_send_email_batch_async if ASYNC_TRANSPORT else None,
+                                      on_result=on_result)
+        pools.append(email_pool)
+    elif send_email_flag:
+        if ASYNC_TRANSPORT:
+            email_pool = ChannelPool("email", "Email", _send_email, ASYNC_CONCURRENCY, stats, lock, blast_id,
+                                     async_send_func=_send_email_async, on_result=on_result)
+        else:
+            email_pool = ChannelPool("email", "Email", _send_email, EMAIL_WORKERS, stats, lock, blast_id,
+                                     on_result=on_result)
+        pools.append(email_pool)
+
+    try:
+        for row in contacts:
+            if whatsapp_pool and row.phone:
+                whatsapp_pool.submit(row.phone, (row.name, message_body, image_url, blast_id))
+
+            if email_pool and row.email:
+                email_pool.submit(row.email, (row.name, message_body))
+
+            if on_row:
+                on_row()
+    finally:
+        for pool in pools:
+            pool.close()
+
+    return stats
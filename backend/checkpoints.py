@@ -0,0 +1,84 @@
+# checkpoints.py
+import json
+import time
+from storage import get_db
+
+# Every successful send is written here right away, so a blast that dies with
+# the worker (redeploy, gunicorn recycle) can be resumed without re-sending.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blasts (
+    blast_id TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    blast_id TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    sent_at REAL NOT NULL,
+    PRIMARY KEY (blast_id, channel, recipient)
+);
+"""
+
+
+def _db():
+    return get_db("checkpoints", SCHEMA)
+
+def start_blast(blast_id, params):
+    """
+    Registers a blast (or marks an existing one as running again when resumed).
+    """
+    now = time.time()
+    db = _db()
+    with db:
+        db.execute(
+            "INSERT INTO blasts (blast_id, params, status, created_at, updated_at) VALUES (?, ?, 'running', ?, ?) "
+            "ON CONFLICT(blast_id) DO UPDATE SET status = 'running', updated_at = excluded.updated_at",
+            (blast_id, json.dumps(params), now, now),
+        )
+
+def set_blast_status(blast_id, status):
+    db = _db()
+    with db:
+        db.execute("UPDATE blasts SET status = ?, updated_at = ? WHERE blast_id = ?", (status, time.time(), blast_id))
+
+def get_blast(blast_id):
+    """
+    Returns {"blast_id", "params", "status", ...} or None.
+    """
+    row = _db().execute("SELECT * FROM blasts WHERE blast_id = ?", (blast_id,)).fetchone()
+    if not row:
+        return None
+    blast = dict(row)
+    blast["params"] = json.loads(blast["params"])
+    return blast
+
+def list_unfinished_blasts():
+    """
+    Blasts that were interrupted or failed (anything not completed), newest first.
+    """
+    rows = _db().execute(
+        "SELECT b.blast_id, b.status, b.created_at, b.updated_at, COUNT(d.recipient) AS delivered "
+        "FROM blasts b LEFT JOIN deliveries d ON d.blast_id = b.blast_id "
+        "WHERE b.status != 'completed' GROUP BY b.blast_id ORDER BY b.created_at DESC"
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def mark_sent(blast_id, channel, recipient):
+    db = _db()
+    with db:
+        db.execute(
+            "INSERT OR IGNORE INTO deliveries (blast_id, channel, recipient, sent_at) VALUES (?, ?, ?, ?)",
+            (blast_id, channel, recipient, time.time()),
+        )
+
+def load_sent(blast_id, channel):
+    """
+    Returns the set of recipients (phones / emails) already sent for this blast + channel.
+    """
+    rows = _db().execute(
+        "SELECT recipient FROM deliveries WHERE blast_id = ? AND channel = ?", (blast_id, channel)
+    ).fetchall()
+    return {row["recipient"] for row in rows}
@@ -0,0 +1,57 @@
+# connections.py
+import os
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- CONFIGURATION ---
+# Keep-alive connection pool per host, sized to match the blast worker pools
+# (see blast.py) plus some headroom for webhook replies.
+POOL_SIZES = {
+    "graph.facebook.com": int(os.getenv("WHATSAPP_WORKERS", "16")) + 8,
+    "api.brevo.com": int(os.getenv("EMAIL_WORKERS", "8")) + 2,
+}
+DEFAULT_POOL_SIZE = 10  # Any other host (e.g. image checks)
+
+# (connect, read) timeout in seconds, used when a call doesn't pass its own
+DEFAULT_TIMEOUT = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("HTTP_READ_TIMEOUT", "20")),
+)
+
+_sessions = {}  # host -> requests.Session
+_sessions_lock = threading.Lock()
+
+
+def get_session(host):
+    """
+    Returns the shared keep-alive session for a host, so every call reuses
+    already-open TCP+TLS connections instead of doing a new handshake.
+    """
+    session = _sessions.get(host)
+    if session:
+        return session
+
+    with _sessions_lock:
+        if host not in _sessions:
+            pool_size = POOL_SIZES.get(host, DEFAULT_POOL_SIZE)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return _sessions[host]
+
+def request(method, url, **kwargs):
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session(urlsplit(url).netloc).request(method, url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def head(url, **kwargs):
+    return request("HEAD", url, **kwargs)
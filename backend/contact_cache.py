@@ -0,0 +1,70 @@
+# contact_cache.py
+import json
+import os
+import time
+from storage import get_db
+
+# Set CONTACT_CACHE=off to always re-read the sheet
+CONTACT_CACHE_ENABLED = os.getenv("CONTACT_CACHE", "on").lower() != "off"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tab_snapshots (
+    spreadsheet_id TEXT NOT NULL,
+    tab TEXT NOT NULL,
+    modified_time TEXT NOT NULL,
+    contacts TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    PRIMARY KEY (spreadsheet_id, tab)
+);
+"""
+
+
+def _db():
+    return get_db("contacts", SCHEMA)
+
+def load_snapshot(spreadsheet_id, tab, modified_time):
+    """
+    Returns the cached contacts of a tab, or None if there is no snapshot
+    or the spreadsheet was modified after it was saved.
+    """
+    if not CONTACT_CACHE_ENABLED or not modified_time:
+        return None
+
+    row = _db().execute(
+        "SELECT modified_time, contacts FROM tab_snapshots WHERE spreadsheet_id = ? AND tab = ?",
+        (spreadsheet_id, tab),
+    ).fetchone()
+    if not row or row["modified_time"] != modified_time:
+        return None
+
+    # Stored as compact [phone, email, name] lists
+    return [
+        {'Phone': phone, 'Email ids': email, 'Name': name, 'Source_Tab': tab}
+        for phone, email, name in json.loads(row["contacts"])
+    ]
+
+def fresh_snapshot_tabs(spreadsheet_id, modified_time):
+    """
+    Returns the names of the tabs with an up-to-date snapshot, without loading any contacts.
+    """
+    if not CONTACT_CACHE_ENABLED or not modified_time:
+        return set()
+
+    rows = _db().execute(
+        "SELECT tab FROM tab_snapshots WHERE spreadsheet_id = ? AND modified_time = ?",
+        (spreadsheet_id, modified_time),
+    ).fetchall()
+    return {row["tab"] for row in rows}
+
+def save_snapshot(spreadsheet_id, tab, modified_time, contacts):
+    if not CONTACT_CACHE_ENABLED or not modified_time:
+        return
+
+    compact = [[c['Phone'], c['Email ids'], c['Name']] for c in contacts]
+    db = _db()
+    with db:
+        db.execute(
+            "INSERT OR REPLACE INTO tab_snapshots (spreadsheet_id, tab, modified_time, contacts, saved_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (spreadsheet_id, tab, modified_time, json.dumps(compact, separators=(",", ":")), time.time()),
+        )
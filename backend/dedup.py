@@ -0,0 +1,76 @@
+# dedup.py
+import threading
+import time
+from collections import OrderedDict
+from storage import get_db
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_ids (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE INDEX IF NOT EXISTS idx_seen_ids_expires ON seen_ids (expires_at);
+"""
+
+# Expired rows on disk are purged every this many new keys
+PURGE_EVERY = 1000
+
+
+class DedupIndex:
+    """
+    Remembers recently processed IDs so redelivered events can be dropped in O(1).
+
+    Memory is bounded: entries expire after ttl seconds and the oldest entries are
+    evicted once max_size is reached. With persist=True the IDs are also written to
+    SQLite, so a restarted worker still recognizes deliveries it already handled.
+    """
+
+    def __init__(self, name, ttl, max_size, persist=False):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.persist = persist
+
+        self.entries = OrderedDict()  # key -> expires_at (oldest first)
+        self.lock = threading.Lock()
+        self.added = 0
+
+    def add_if_new(self, key):
+        """
+        Records the key. Returns True if it is new, False if it was already seen.
+        """
+        now = time.time()
+        with self.lock:
+            self._evict(now)
+            if key in self.entries:
+                return False
+            if len(self.entries) >= self.max_size:
+                self.entries.popitem(last=False)  # Make room: drop the oldest
+            self.entries[key] = now + self.ttl
+            self.added += 1
+            purge = self.persist and self.added % PURGE_EVERY == 0
+
+        if self.persist:
+            return self._add_to_disk(key, now, purge)
+        return True
+
+    def _evict(self, now):
+        entries = self.entries
+        while entries and (len(entries) > self.max_size or next(iter(entries.values())) <= now):
+            entries.popitem(last=False)
+
+    def _add_to_disk(self, key, now, purge):
+        db = get_db("dedup", SCHEMA)
+        with db:
+            if purge:
+                db.execute("DELETE FROM seen_ids WHERE expires_at <= ?", (now,))
+            cursor = db.execute(
+                "INSERT INTO seen_ids (name, key, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name, key) DO UPDATE SET expires_at = excluded.expires_at "
+                "WHERE seen_ids.expires_at <= ?",
+                (self.name, key, now + self.ttl, now),
+            )
+        # No row written = the key is on disk and still fresh
+        return cursor.rowcount > 0
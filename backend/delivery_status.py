@@ -0,0 +1,152 @@
+# delivery_status.py
+import os
+import queue
+import threading
+import time
+from storage import get_db
+
+# --- CONFIGURATION ---
+# Status callbacks are written in batches: up to STATUS_BATCH_SIZE rows per commit,
+# and never more than STATUS_FLUSH_INTERVAL seconds after they arrived
+STATUS_BATCH_SIZE = int(os.getenv("STATUS_BATCH_SIZE", "500"))
+STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "0.5"))
+
+# One row per WhatsApp message (wamid), holding its furthest status.
+# "accepted" = the Cloud API took the message (written by the blast itself).
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_status (
+    wamid TEXT PRIMARY KEY,
+    blast_id TEXT,
+    phone TEXT,
+    status TEXT NOT NULL,
+    status_rank INTEGER NOT NULL,
+    error_code INTEGER,
+    error_message TEXT,
+    sent_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_message_status_blast ON message_status (blast_id, status);
+CREATE INDEX IF NOT EXISTS idx_message_status_phone ON message_status (phone);
+"""
+
+# Callbacks can arrive out of order ("delivered" after "read"), so a status only
+# replaces a lower-ranked one. "failed" is final.
+STATUS_RANKS = {"accepted": 0, "sent": 1, "delivered": 2, "read": 3, "failed": 4}
+
+UPSERT = """
+INSERT INTO message_status (wamid, blast_id, phone, status, status_rank, error_code, error_message, sent_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(wamid) DO UPDATE SET
+    blast_id = COALESCE(message_status.blast_id, excluded.blast_id),
+    phone = COALESCE(message_status.phone, excluded.phone),
+    sent_at = COALESCE(message_status.sent_at, excluded.sent_at),
+    status = CASE WHEN excluded.status_rank > message_status.status_rank THEN excluded.status ELSE message_status.status END,
+    error_code = CASE WHEN excluded.status_rank > message_status.status_rank THEN excluded.error_code ELSE message_status.error_code END,
+    error_message = CASE WHEN excluded.status_rank > message_status.status_rank THEN excluded.error_message ELSE message_status.error_message END,
+    status_rank = MAX(message_status.status_rank, excluded.status_rank),
+    updated_at = excluded.updated_at
+"""
+
+_pending = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _db():
+    return get_db("delivery_status", SCHEMA)
+
+def record_sent(wamid, blast_id, phone):
+    """
+    Remembers which blast + phone a message ID belongs to (called when the API accepted it).
+    """
+    now = time.time()
+    _enqueue((wamid, blast_id, phone, "accepted", STATUS_RANKS["accepted"], None, None, now, now))
+
+def record_status(wamid, status, phone=None, error_code=None, error_message=None):
+    """
+    Records a status callback from the webhook (sent / delivered / read / failed).
+    """
+    rank = STATUS_RANKS.get(status)
+    if not wamid or rank is None:
+        return
+    _enqueue((wamid, None, phone, status, rank, error_code, error_message, None, time.time()))
+
+def _enqueue(row):
+    _start_writer()
+    _pending.put(row)
+
+
+def _start_writer():
+    # Started lazily (after gunicorn has forked the worker process)
+    global _writer
+    if _writer:
+        return
+    with _writer_lock:
+        if not _writer:
+            _writer = threading.Thread(target=_write_forever, name="delivery-status", daemon=True)
+            _writer.start()
+
+def _write_forever():
+    while True:
+        rows = [_pending.get()]
+        # Gather whatever else arrives in the next moment, then commit it all at once
+        deadline = time.monotonic() + STATUS_FLUSH_INTERVAL
+        while len(rows) < STATUS_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                rows.append(_pending.get(timeout=timeout))
+            except queue.Empty:
+                break
+        try:
+            db = _db()
+            with db:
+                db.executemany(UPSERT, rows)
+        except Exception as e:
+            print(f"⚠️ Could not save {len(rows)} delivery status update(s): {e}")
+
+def blast_report(blast_id):
+    """
+    Delivery aggregates of one blast's WhatsApp messages, or None if we have no messages for it.
+    "delivered" counts read messages too (a read message was delivered).
+    """
+    db = _db()
+    rows = db.execute(
+        "SELECT status, COUNT(*) AS n FROM message_status WHERE blast_id = ? GROUP BY status", (blast_id,)
+    ).fetchall()
+    by_status = {status: 0 for status in STATUS_RANKS}
+    for row in rows:
+        by_status[row["status"]] = row["n"]
+    total = sum(by_status.values())
+    if not total:
+        return None
+
+    errors = db.execute(
+        "SELECT error_code, error_message, COUNT(*) AS n FROM message_status "
+        "WHERE blast_id = ? AND status = 'failed' GROUP BY error_code, error_message ORDER BY n DESC LIMIT 10",
+        (blast_id,),
+    ).fetchall()
+
+    delivered = by_status["delivered"] + by_status["read"]
+    return {
+        "blast_id": blast_id,
+        "messages": total,
+        "by_status": by_status,
+        "delivered": delivered,
+        "delivery_rate": round(delivered / total, 4),
+        "read_rate": round(by_status["read"] / total, 4),
+        "failure_rate": round(by_status["failed"] / total, 4),
+        "top_errors": [{"code": row["error_code"], "message": row["error_message"], "count": row["n"]} for row in errors],
+    }
+
+def phone_history(phone, limit=20):
+    """
+    Latest messages sent to a phone number with their current status, newest first.
+    """
+    rows = _db().execute(
+        "SELECT wamid, blast_id, status, error_code, error_message, sent_at, updated_at FROM message_status "
+        "WHERE phone = ? ORDER BY updated_at DESC LIMIT ?",
+        (phone, limit),
+    ).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,65 @@
+# email_template.py
+import datetime
+import html
+import os
+import re
+
+# --- CONFIGURATION ---
+EMAIL_TEMPLATE_PATH = os.getenv(
+    "EMAIL_TEMPLATE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "blast_email.html"),
+)
+
+# {{ field }} placeholders (the CSS only uses single braces)
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+class EmailTemplate:
+    """
+    An HTML layout parsed once into literal chunks and field names, so rendering an
+    email is a single join instead of rebuilding the whole document (CSS included).
+    Indentation is stripped at load time, which also makes every email smaller.
+    """
+
+    def __init__(self, source):
+        source = "\n".join(line.strip() for line in source.splitlines() if line.strip())
+        parts = _PLACEHOLDER.split(source)
+        self.literals = parts[0::2]  # always one more literal than fields
+        self.fields = parts[1::2]
+
+    def render(self, values):
+        """
+        values: dict of field -> already escaped HTML.
+        """
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            out.append(values[field])
+            out.append(literal)
+        return "".join(out)
+
+
+def render_blast_email(user_name, body_text):
+    """
+    Returns the HTML of a blast email. Name and message are HTML-escaped,
+    line breaks in the message become <br>.
+    """
+    return BLAST_EMAIL.render({
+        "user_name": html.escape(user_name),
+        "body": html.escape(body_text).replace("\n", "<br>"),
+        "year": str(datetime.date.today().year),
+    })
+
+def render_blast_email_with_placeholder(body_text, name_placeholder):
+    """
+    Like render_blast_email(), but the name is left as a placeholder (inserted as is)
+    for the provider to fill in per recipient, e.g. Brevo's "{{params.user_name}}".
+    """
+    return BLAST_EMAIL.render({
+        "user_name": name_placeholder,
+        "body": html.escape(body_text).replace("\n", "<br>"),
+        "year": str(datetime.date.today().year),
+    })
+
+
+with open(EMAIL_TEMPLATE_PATH, "r", encoding="utf-8") as f:
+    BLAST_EMAIL = EmailTemplate(f.read())
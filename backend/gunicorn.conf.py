@@ -0,0 +1,26 @@
+# gunicorn.conf.py
+# Loaded automatically by "gunicorn app:app" when started from this folder
+# (Render start command: cd backend && gunicorn app:app)
+import os
+
+# Must match the defaults in app.py
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", "2"))
+SSE_MAX_SECONDS = int(os.getenv("SSE_MAX_SECONDS", "300"))
+# Threads that are never taken by a log stream (/webhook, blasts API, dashboard)
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+# ONE process: blast jobs, the job registry, the live logs and the webhook queue
+# all live in its memory (see jobs.py). More workers = jobs the API can't find.
+workers = 1
+
+# Threads, not the default sync worker: with "sync" one open /api/stream-logs
+# would take the only worker and block /webhook until it closes.
+worker_class = "gthread"
+threads = SSE_MAX_STREAMS + WEB_THREADS
+
+# A log stream stays open up to SSE_MAX_SECONDS; the worker must never be
+# killed (with the blast running in it) before that
+timeout = SSE_MAX_SECONDS + 60
+graceful_timeout = 30
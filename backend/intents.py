@@ -0,0 +1,99 @@
+# intents.py
+import json
+import os
+import re
+
+# Punctuation around words doesn't change the intent ("price?" == "price")
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+class IntentMatcher:
+    """
+    Classifies a message against the whole intent table in one pass.
+
+    The table is a list of dicts: {"name", "keywords", "reply", "exact"}, in priority
+    order (first = highest). "exact" intents only match when the whole message is one
+    of the keywords; the others match keywords as whole words anywhere in the message,
+    so "where" no longer matches inside "anywhere" (a plural "s" is still allowed).
+    """
+
+    def __init__(self, intents):
+        self.intents = intents
+        self.exact = {}  # normalized message -> intent index
+        patterns = []
+
+        for index, intent in enumerate(intents):
+            keywords = {normalize_text(k) for k in intent["keywords"]}
+            keywords.discard("")
+            if intent.get("exact"):
+                for keyword in keywords:
+                    self.exact.setdefault(keyword, index)
+            elif keywords:
+                # Longest first, so "how much" wins over a shorter keyword at the same spot
+                alternatives = "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+                patterns.append(f"(?P<i{index}>{alternatives})")
+
+        # One compiled regex for every "contains" intent, with word boundaries
+        # (a plural "s" is allowed, so "prices" still matches "price")
+        self.pattern = re.compile(r"(?<!\w)(?:" + "|".join(patterns) + r")s?(?!\w)") if patterns else None
+
+    def match(self, text):
+        """
+        Returns the best matching intent dict, or None (→ ask the LLM).
+        """
+        clean_text = normalize_text(text)
+
+        index = self.exact.get(clean_text)
+        if index is not None:
+            return self.intents[index]
+        if not self.pattern:
+            return None
+
+        best = None
+        for m in self.pattern.finditer(clean_text):
+            matched = int(m.lastgroup[1:])
+            if best is None or matched < best:
+                best = matched
+                if best == 0:
+                    break
+        return self.intents[best] if best is not None else None
+
+
+def load_intents_file(path):
+    """
+    Loads extra intents from a JSON file (same format as the intent table).
+    Returns [] if the file doesn't exist.
+    """
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        intents = json.load(f)
+    if not isinstance(intents, list):
+        raise ValueError(f"{path}: expected a list of intents")
+    for position, intent in enumerate(intents):
+        missing = [field for field in ("name", "keywords", "reply") if not isinstance(intent, dict) or field not in intent]
+        if missing:
+            raise ValueError(f"{path}: intent #{position + 1} is missing {', '.join(missing)}")
+    print(f"🧭 Loaded {len(intents)} extra intents from {path}")
+    return intents
+
+def merge_intents(intents, extra_intents):
+    """
+    Returns the intent table with the extra intents applied: an extra intent with the
+    name of an existing one replaces it at the same priority, new ones are added last.
+    """
+    merged = list(intents)
+    positions = {intent["name"]: index for index, intent in enumerate(merged)}
+    for intent in extra_intents:
+        if intent["name"] in positions:
+            merged[positions[intent["name"]]] = intent
+        else:
+            positions[intent["name"]] = len(merged)
+            merged.append(intent)
+    return merged
@@ -0,0 +1,168 @@
+# jobs.py
+import queue
+import threading
+import time
+import uuid
+from logstore import live_logs
+
+# How many finished jobs we remember for the status endpoints
+MAX_FINISHED_JOBS = 50
+# Live dashboards get a "blast_progress" event at most this often (seconds)
+PROGRESS_EVENT_INTERVAL = 0.5
+
+# NOTE: Jobs live in this process only. Run gunicorn with ONE worker and threads
+# (gthread) so the status endpoint always talks to the process that owns the job.
+# Every open /api/stream-logs dashboard also holds one of those threads while it is
+# connected (at most SSE_MAX_STREAMS, see app.py). gunicorn.conf.py sets all of this.
+
+
+class BlastJob:
+    """
+    One queued blast. The runner fills in the progress fields while it sends.
+    """
+
+    def __init__(self, params, job_id=None):
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.params = params
+        self.status = "queued"  # queued -> running -> completed / failed
+        self.error = None
+
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self.total_rows = None  # Grows tab by tab while the sheet is streamed
+        self.rows_processed = 0
+        self.stats = {"whatsapp_sent": 0, "whatsapp_fail": 0, "email_sent": 0, "email_fail": 0}
+
+        self.next_progress_event = 0.0
+        self.progress_lock = threading.Lock()
+
+    def tab_loaded(self, title, unique_rows):
+        self.total_rows = (self.total_rows or 0) + unique_rows
+
+    def row_done(self):
+        self.rows_processed += 1
+        self.progress_changed()
+
+    def progress_changed(self):
+        """
+        Publishes a "blast_progress" event to the live logs, throttled to
+        one per PROGRESS_EVENT_INTERVAL however fast rows and sends complete.
+        """
+        now = time.monotonic()
+        with self.progress_lock:
+            if now < self.next_progress_event:
+                return
+            self.next_progress_event = now + PROGRESS_EVENT_INTERVAL
+        live_logs.append("blast_progress", f"Blast {self.job_id} progress", blast_id=self.job_id, job=self.to_dict())
+
+    def to_dict(self):
+        """
+        Snapshot of the job for the API, including throughput and ETA.
+        """
+        end = self.finished_at or time.time()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        messages_done = sum(self.stats.values())
+
+        rows_per_sec = self.rows_processed / elapsed if elapsed > 0 else 0.0
+        eta_seconds = None
+        if self.status == "running" and self.total_rows is not None and rows_per_sec > 0:
+            eta_seconds = round((self.total_rows - self.rows_processed) / rows_per_sec, 1)
+        elif self.status == "completed":
+            eta_seconds = 0
+
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "total_rows": self.total_rows,
+            "rows_processed": self.rows_processed,
+            "stats": dict(self.stats),
+            "elapsed_seconds": round(elapsed, 1),
+            "throughput": {
+                "rows_per_sec": round(rows_per_sec, 2),
+                "messages_per_sec": round(messages_done / elapsed, 2) if elapsed > 0 else 0.0,
+            },
+            "eta_seconds": eta_seconds,
+        }
+
+
+_jobs = {}  # job_id -> BlastJob
+_jobs_lock = threading.Lock()
+_job_queue = queue.Queue()
+_runner_thread = None
+
+
+def submit_job(params, target, job_id=None):
+    """
+    Queues target(job) to run in the background and returns the new job right away.
+    Pass job_id to re-run an earlier job under the same ID (resume).
+    Returns None if a job with that ID is still queued or running.
+    """
+    global _runner_thread
+    job = BlastJob(params, job_id)
+
+    with _jobs_lock:
+        existing = _jobs.get(job.job_id)
+        if existing and existing.status in ("queued", "running"):
+            return None
+        _jobs[job.job_id] = job
+        # Start the runner lazily (after gunicorn has forked the worker)
+        if _runner_thread is None or not _runner_thread.is_alive():
+            _runner_thread = threading.Thread(target=_run_forever, name="blast-runner", daemon=True)
+            _runner_thread.start()
+
+    _job_queue.put((job, target))
+    print(f"📥 Blast job {job.job_id} queued (position {_job_queue.qsize()})")
+    return job
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def list_jobs():
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+
+def _run_forever():
+    """
+    Background runner: executes one blast at a time, in the order they were queued.
+    """
+    while True:
+        job, target = _job_queue.get()
+        job.status = "running"
+        job.started_at = time.time()
+        print(f"🚀 Blast job {job.job_id} started")
+        _publish_status(job, f"🚀 Blast job {job.job_id} started")
+        try:
+            target(job)
+            job.status = "completed"
+            print(f"🏁 Blast job {job.job_id} completed: {job.stats}")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ Blast job {job.job_id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            if job.status == "completed":
+                _publish_status(job, f"🏁 Blast job {job.job_id} completed")
+            else:
+                _publish_status(job, f"❌ Blast job {job.job_id} failed: {job.error}", level="error")
+            _job_queue.task_done()
+            _forget_old_jobs()
+
+def _publish_status(job, message, level="info"):
+    live_logs.append("blast_status", message, level=level, blast_id=job.job_id, job=job.to_dict())
+
+def _forget_old_jobs():
+    with _jobs_lock:
+        finished = [j for j in _jobs.values() if j.finished_at]
+        finished.sort(key=lambda j: j.finished_at)
+        for job in finished[:-MAX_FINISHED_JOBS]:
+            del _jobs[job.job_id]
@@ -0,0 +1,187 @@
+# llm_cache.py
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from difflib import SequenceMatcher
+import numpy as np
+from intents import normalize_text
+
+# --- CONFIGURATION ---
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "21600"))  # 6 hours
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2000"))
+
+# Near-duplicate questions (paraphrases) are answered from the semantic cache when
+# their cosine similarity to a past question is at least this high AND they share
+# the same content words (see _same_topic)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+SEMANTIC_VECTOR_DIM = 1024
+
+
+class ReplyCache:
+    """
+    LRU cache of LLM answers keyed by the normalized question text
+    ("Do you do SEO?" and "do you do seo" share one entry). Entries expire after ttl seconds.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> (reply, expires_at), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        key = normalize_text(text)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, text, reply):
+        key = normalize_text(text)
+        if not key:
+            return
+        with self.lock:
+            self.entries[key] = (reply, time.time() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+def _ngram_vector(text, dim=SEMANTIC_VECTOR_DIM):
+    """
+    L2-normalized character 3-gram vector of a question (hashing trick, no vocabulary to keep).
+    Character n-grams make typos and word order changes ("seo do you do?") still look similar.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in normalize_text(text).split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            # crc32 rather than hash(): the same on every run and in every process
+            vector[zlib.crc32(padded[i:i + 3].encode()) % dim] += 1.0
+    # Sublinear term frequency, so one repeated word can't dominate
+    np.log1p(vector, out=vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# Words that don't say WHAT the customer asks about ("can you tell me the price of
+# your ... services"); everything else must match between two questions
+_FILLER_WORDS = frozenset("""
+a an the of for to in on at by with and or from about
+i me my we us our you your u ur it its this that these those there
+is are am was be been do does did can could would will shall should may might
+what whats how much many when where which who why
+tell know want need like please pls kindly plz any some get give
+hi hello hey sir madam ok okay
+service services
+""".split())
+
+
+def _content_words(text):
+    return frozenset(word for word in normalize_text(text).split() if word not in _FILLER_WORDS)
+
+def _similar_word(word, other):
+    # Typos and plurals ("logos", "desgin") still count as the same word, short words must be exact
+    if word == other:
+        return True
+    return min(len(word), len(other)) >= 4 and SequenceMatcher(None, word, other).ratio() >= 0.8
+
+def _same_topic(words, other_words):
+    """
+    True if every content word of each question has a match in the other one.
+    The n-gram score alone can't tell "logo design" from "website design" when the
+    rest of a long question is identical; the word that differs is the one that matters.
+    """
+    return all(any(_similar_word(w, o) for o in other_words) for w in words) and \
+        all(any(_similar_word(o, w) for w in words) for o in other_words)
+
+
+class SemanticCache:
+    """
+    Small in-process similarity index over past question/answer pairs.
+
+    Questions are stored as rows of one preallocated matrix, so a lookup is a single
+    matrix-vector product (cosine similarity) over every cached question. Candidates
+    above the threshold must also pass the content word check (_same_topic). When full,
+    the oldest entry is overwritten (ring buffer). Entries expire after ttl seconds.
+    """
+
+    def __init__(self, ttl, max_size, threshold, dim=SEMANTIC_VECTOR_DIM):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.threshold = threshold
+
+        self.vectors = np.zeros((max_size, dim), dtype=np.float32)
+        self.replies = [None] * max_size
+        self.words = [None] * max_size  # Content words of each cached question
+        self.expires = np.zeros(max_size, dtype=np.float64)
+        self.count = 0  # Filled rows
+        self.next_slot = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        vector = _ngram_vector(text)
+        words = _content_words(text)
+        with self.lock:
+            if self.count:
+                scores = self.vectors[:self.count] @ vector
+                scores[self.expires[:self.count] <= time.time()] = -1.0
+                candidates = np.flatnonzero(scores >= self.threshold)
+                # Best score first
+                for slot in candidates[np.argsort(-scores[candidates])]:
+                    if _same_topic(words, self.words[slot]):
+                        self.hits += 1
+                        return self.replies[slot]
+            self.misses += 1
+            return None
+
+    def put(self, text, reply):
+        vector = _ngram_vector(text)
+        if not vector.any():
+            return
+        with self.lock:
+            slot = self.next_slot
+            self.vectors[slot] = vector
+            self.replies[slot] = reply
+            self.words[slot] = _content_words(text)
+            self.expires[slot] = time.time() + self.ttl
+            self.next_slot = (slot + 1) % self.max_size
+            self.count = min(self.count + 1, self.max_size)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self.count,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "threshold": self.threshold,
+            }
+
+
+reply_cache = ReplyCache(LLM_CACHE_TTL, LLM_CACHE_SIZE)
+semantic_cache = SemanticCache(LLM_CACHE_TTL, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD)
@@ -0,0 +1,188 @@
+# llm_gateway.py
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+# --- CONFIGURATION ---
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))  # Concurrent LLM requests
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))  # Deadline per LLM call (seconds)
+LLM_SLOT_WAIT = float(os.getenv("LLM_SLOT_WAIT", "5"))  # Max wait for a free slot before falling back
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # Consecutive failures that open the breaker
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # Seconds before trying the LLM again
+
+
+class LLMUnavailable(Exception):
+    """Raised when the gateway refuses or fails a call (the caller uses its fallback reply)."""
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold consecutive failures) -> open -> (cooldown) -> half-open.
+    While open every call is refused instantly; in half-open one trial call is let through.
+    """
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_running:
+                    print(f"🔌 LLM circuit breaker OPEN for {self.cooldown:.0f}s after {self.failures} failure(s)")
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class LLMGateway:
+    """
+    Guards the Groq client: caps in-flight requests, enforces a deadline per call and
+    trips a circuit breaker after repeated failures, so a slow or down LLM can't stall
+    the webhook workers. Keeps latency metrics for /api/llm-stats.
+    With an async_client, chat_async() does the same on the async transport's event loop.
+    """
+
+    def __init__(self, client, max_in_flight, timeout, slot_wait, breaker, async_client=None):
+        # Retries would stretch the deadline, the breaker handles repeated failures instead
+        self.client = client.with_options(max_retries=0)
+        self.async_client = async_client.with_options(max_retries=0) if async_client else None
+        self.timeout = timeout
+        self.slot_wait = slot_wait
+        self.max_in_flight = max_in_flight
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.async_slots = None  # asyncio.Semaphore, created on the event loop on first use
+        self.breaker = breaker
+
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=500)  # Seconds, most recent calls
+        self.counters = {"calls": 0, "success": 0, "failed": 0, "rejected_breaker": 0, "rejected_busy": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _check_breaker(self):
+        # Cheap check first, so calls fail instantly while the breaker is open
+        self._count("calls")
+        if self.breaker.state == "open":
+            self._count("rejected_breaker")
+            raise LLMUnavailable("circuit breaker open")
+
+    def _allow_call(self, release_slot):
+        if not self.breaker.allow():
+            release_slot()
+            self._count("rejected_breaker")
+            raise LLMUnavailable("circuit breaker open")
+
+    def _record(self, start, error=None):
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+        if error is not None:
+            self.breaker.record_failure()
+            self._count("failed")
+            raise LLMUnavailable(str(error)) from error
+        self.breaker.record_success()
+        self._count("success")
+
+    def chat(self, messages, model):
+        """
+        Returns the reply text, or raises LLMUnavailable.
+        """
+        self._check_breaker()
+        if not self.slots.acquire(timeout=self.slot_wait):
+            self._count("rejected_busy")
+            raise LLMUnavailable("too many LLM requests in flight")
+        self._allow_call(self.slots.release)
+
+        start = time.monotonic()
+        try:
+            chat_completion = self.client.chat.completions.create(
+                messages=messages,
+                model=model,
+                timeout=self.timeout,
+            )
+            reply = chat_completion.choices[0].message.content
+        except Exception as e:
+            self._record(start, e)
+        finally:
+            self.slots.release()
+
+        self._record(start)
+        return reply
+
+    async def chat_async(self, messages, model):
+        """
+        Awaitable chat(): waits for a slot without blocking the event loop.
+        """
+        self._check_breaker()
+        if self.async_slots is None:
+            self.async_slots = asyncio.Semaphore(self.max_in_flight)
+        try:
+            await asyncio.wait_for(self.async_slots.acquire(), self.slot_wait)
+        except asyncio.TimeoutError:
+            self._count("rejected_busy")
+            raise LLMUnavailable("too many LLM requests in flight")
+        self._allow_call(self.async_slots.release)
+
+        start = time.monotonic()
+        try:
+            chat_completion = await self.async_client.chat.completions.create(
+                messages=messages,
+                model=model,
+                timeout=self.timeout,
+            )
+            reply = chat_completion.choices[0].message.content
+        except Exception as e:
+            self._record(start, e)
+        finally:
+            self.async_slots.release()
+
+        self._record(start)
+        return reply
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            counters = dict(self.counters)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000)
+
+        return {
+            **counters,
+            "breaker": self.breaker.state,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+        }
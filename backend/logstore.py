@@ -0,0 +1,107 @@
+# logstore.py
+import heapq
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+# --- CONFIGURATION ---
+# Newest blast status events and failures (async delivery errors) kept for the dashboard
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "1000"))
+# Newest high-volume events (one per recipient + progress ticks), kept in their own
+# ring so a big blast can't push the failures out of the first one
+RESULT_LOG_BUFFER_SIZE = int(os.getenv("RESULT_LOG_BUFFER_SIZE", "5000"))
+RESULT_EVENT_TYPES = frozenset({"recipient_result", "blast_progress"})
+
+
+class LogStore:
+    """
+    Fixed-size, thread-safe ring buffers of structured log events for the dashboard.
+
+    Every event gets the next sequence number. Readers keep a cursor (the last seq
+    they saw) and only fetch newer events, so nothing is cleared on read, any number
+    of dashboards can follow the same logs, and memory stays constant: once full,
+    the oldest events are dropped. Streaming readers can block in wait() until
+    something new arrives.
+
+    Events of a bulk type (bulk_types) go to a second ring of bulk_capacity, so they
+    only ever push out each other. Both rings share the sequence numbers, reads merge them.
+    """
+
+    def __init__(self, capacity, bulk_capacity=0, bulk_types=frozenset()):
+        self.entries = deque(maxlen=capacity)
+        self.bulk_entries = deque(maxlen=bulk_capacity)
+        self.bulk_types = bulk_types
+        self.last_seq = 0
+        self.lock = threading.Lock()
+        self.new_entry = threading.Condition(self.lock)
+
+    def append(self, kind, message, level="info", **fields):
+        """
+        Adds an event. kind is a short machine-readable type (e.g. "delivery_failed"),
+        extra fields (phone, code...) are stored as is. Returns the event.
+        """
+        with self.lock:
+            self.last_seq += 1
+            entry = {
+                "seq": self.last_seq,
+                "time": time.time(),
+                "type": kind,
+                "level": level,
+                "message": message,
+                **fields,
+            }
+            ring = self.bulk_entries if kind in self.bulk_types else self.entries
+            ring.append(entry)
+            self.new_entry.notify_all()
+        return entry
+
+    def read(self, cursor=0, limit=None):
+        """
+        Returns (events newer than cursor, next cursor, dropped), oldest first.
+        dropped = events the reader missed because they already left the buffer.
+        A cursor from before a restart (bigger than anything we have) starts over.
+        """
+        with self.lock:
+            if cursor > self.last_seq:
+                cursor = 0
+            last_seq = self.last_seq
+            newer = [_newer_than(cursor, ring) for ring in (self.entries, self.bulk_entries)]
+        events = list(islice(heapq.merge(*newer, key=_seq), limit))
+
+        # Everything up to next_cursor that isn't in events was dropped
+        if limit and len(events) == limit:
+            next_cursor = events[-1]["seq"]
+        else:
+            next_cursor = last_seq
+        dropped = next_cursor - cursor - len(events)
+        return events, next_cursor, dropped
+
+    def wait(self, cursor, timeout):
+        """
+        Blocks until there is an event newer than cursor. Returns False on timeout.
+        """
+        with self.lock:
+            return self.new_entry.wait_for(lambda: self.last_seq > cursor, timeout)
+
+    def latest_seq(self):
+        with self.lock:
+            return self.last_seq
+
+
+def _seq(entry):
+    return entry["seq"]
+
+def _newer_than(cursor, ring):
+    # Walks back from the newest event, so following the logs costs O(new events)
+    newer = []
+    for entry in reversed(ring):
+        if entry["seq"] <= cursor:
+            break
+        newer.append(entry)
+    newer.reverse()
+    return newer
+
+
+live_logs = LogStore(LOG_BUFFER_SIZE, RESULT_LOG_BUFFER_SIZE, RESULT_EVENT_TYPES)
@@ -0,0 +1,93 @@
+# memory.py
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# --- CONFIGURATION ---
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))  # user + bot message pairs kept per phone
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1200"))  # max history sent to the LLM
+CHAT_IDLE_TTL = int(os.getenv("CHAT_IDLE_TTL", "1800"))  # forget a chat after 30 min of silence
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "5000"))
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting
+    return len(text) // 4 + 4
+
+
+class ConversationStore:
+    """
+    Recent turns per phone number, so the LLM remembers the conversation.
+
+    Memory stays flat: each phone keeps a ring buffer of max_turns turns, idle chats
+    are evicted after idle_ttl seconds, and only max_sessions chats are kept
+    (least recently active dropped first).
+    """
+
+    def __init__(self, max_turns, token_budget, idle_ttl, max_sessions):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+
+        self.sessions = OrderedDict()  # phone -> (deque of (user_text, reply, static), last_seen), oldest activity first
+        self.lock = threading.Lock()
+
+    def history(self, phone):
+        """
+        Returns the chat history as LLM messages, newest turns kept within the token budget.
+        """
+        with self.lock:
+            self._evict(time.time())
+            session = self.sessions.get(phone)
+            turns = list(session[0]) if session else []
+
+        messages = []
+        budget = self.token_budget
+        for user_text, reply, _ in reversed(turns):
+            cost = estimate_tokens(user_text) + estimate_tokens(reply)
+            if cost > budget:
+                break
+            budget -= cost
+            messages[:0] = [
+                {"role": "user", "content": user_text},
+                {"role": "assistant", "content": reply},
+            ]
+        return messages
+
+    def has_llm_turns(self, phone):
+        """
+        True if the chat has an LLM answer in it. Static replies are the same for
+        everyone, so a chat with only those still gets context-free (cacheable) answers.
+        """
+        with self.lock:
+            session = self.sessions.get(phone)
+            return bool(session) and any(not static for _, _, static in session[0])
+
+    def add_turn(self, phone, user_text, reply, static=False):
+        """
+        static: the reply came from the intent table, not the LLM.
+        """
+        now = time.time()
+        with self.lock:
+            session = self.sessions.pop(phone, None)
+            turns = session[0] if session else deque(maxlen=self.max_turns)
+            turns.append((user_text, reply, static))
+            self.sessions[phone] = (turns, now)  # Re-inserted = most recently active
+            self._evict(now)
+
+    def _evict(self, now):
+        sessions = self.sessions
+        while sessions:
+            _, last_seen = next(iter(sessions.values()))
+            if len(sessions) <= self.max_sessions and now - last_seen < self.idle_ttl:
+                break
+            sessions.popitem(last=False)
+
+    def active_sessions(self):
+        with self.lock:
+            return len(self.sessions)
+
+
+conversations = ConversationStore(CHAT_HISTORY_TURNS, CHAT_HISTORY_TOKENS, CHAT_IDLE_TTL, CHAT_MAX_SESSIONS)
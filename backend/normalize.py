@@ -0,0 +1,103 @@
+# normalize.py
+import re
+from collections import namedtuple
+from operator import itemgetter
+
+# One row of the send plan: cleaned values, phone/email are None when unusable
+Recipient = namedtuple("Recipient", ["name", "phone", "email", "tab"])
+
+DEFAULT_NAME = "Valued Customer"
+
+# --- COMPILED PATTERNS ---
+# A column is cleaned as ONE string with every cell framed by separators
+# ("\x00cell1\x00cell2\x00"), so each rule is a single regex pass over the whole
+# column (in C) instead of Python code per cell. Most rules are anchored on the
+# separator, i.e. they only look at the start of each cell.
+_SEP = "\x00"
+
+_NAME_SUFFIX = re.compile(r"[-|][^\x00]*")  # "Acme - Delhi" / "Acme | Retail" -> "Acme"
+
+_PHONE_EXTRA = re.compile(r"[,/;|][^\x00]*")  # Several numbers in one cell: keep the first
+_PHONE_JUNK = re.compile(r"[^\d+\x00]|\+(?<!\x00\+)")  # Spaces, dashes, brackets, dots, a "+" that isn't leading
+_PHONE_LANDLINE = re.compile(r"\x00011\d*")  # 011 = Delhi landline (no WhatsApp)
+_PHONE_TRUNK = re.compile(r"\x000+")  # Leading 0s (trunk prefix)
+_PHONE_TOO_SHORT = re.compile(r"\x00\+?\d{0,9}(?=\x00)")
+_PHONE_LOCAL = re.compile(r"\x00(?=\d{10}\x00|(?!91)\d)")  # 10 digits or no country code -> add 91
+_PHONE_PLUS = re.compile(r"\+")
+
+_EMAIL_INVISIBLE = re.compile(r"[\r\n\t\xa0\u200b]")  # Newlines, tabs, non-breaking / zero-width spaces
+_EMAIL_LEADING_SPACES = re.compile(r"\x00\s+")
+# Everything after the first address: "a@x.com, b@y.com", "a@x.com / b@y.com", "a@x.com (Personal)"
+_EMAIL_EXTRA = re.compile(r"[,/\s][^\x00]*")
+_EMAIL_INVALID = re.compile(r"\x00(?![^@\x00]+@[^@\x00]+\.[^@\x00]+\x00)[^\x00]*")
+
+
+def _column(values):
+    column = _SEP.join(values)
+    if column.count(_SEP) != len(values) - 1:
+        # A cell contained the separator itself (never in real sheets), drop it
+        column = _SEP.join(value.replace(_SEP, "") for value in values)
+    return _SEP + column + _SEP
+
+def _cells(column):
+    return column[1:-1].split(_SEP)
+
+def normalize_names(values):
+    if not values:
+        return []
+    column = _NAME_SUFFIX.sub("", _column(values))
+    return [name.strip() or DEFAULT_NAME for name in _cells(column)]
+
+def normalize_phones(values):
+    """
+    Returns each phone in international format without "+" (91XXXXXXXXXX),
+    or None if the cell is unusable.
+    """
+    if not values:
+        return []
+    column = _PHONE_JUNK.sub("", _PHONE_EXTRA.sub("", _column(values)))
+    # The landline check runs before the trunk "0" is dropped
+    column = _PHONE_LANDLINE.sub(_SEP, column)
+    column = _PHONE_TRUNK.sub(_SEP, column)
+    column = _PHONE_TOO_SHORT.sub(_SEP, column)
+    column = _PHONE_LOCAL.sub(_SEP + "91", column)
+    column = _PHONE_PLUS.sub("", column)
+    return [phone or None for phone in _cells(column)]
+
+def normalize_emails(values):
+    """
+    Returns a single lowercase email address per cell, or None if the cell is unusable.
+    """
+    if not values:
+        return []
+    column = _EMAIL_INVISIBLE.sub("", _column(values)).lower()
+    column = _EMAIL_LEADING_SPACES.sub(_SEP, column)
+    column = _EMAIL_EXTRA.sub("", column)
+    column = _EMAIL_INVALID.sub(_SEP, column)
+    return [email or None for email in _cells(column)]
+
+
+def build_send_plan(tab, contacts, seen):
+    """
+    Turns one tab's contacts ({Phone, Email ids, Name} rows of strings, see
+    services._map_tab_contacts) into its send plan:
+    a list of Recipients, cleaned column by column and deduplicated on the
+    normalized (phone, email) pair. seen is shared across the tabs of a blast.
+    Rows with neither a usable phone nor a usable email are dropped.
+    """
+    names = normalize_names(list(map(itemgetter("Name"), contacts)))
+    phones = normalize_phones(list(map(itemgetter("Phone"), contacts)))
+    raw_emails = list(map(itemgetter("Email ids"), contacts))
+    emails = normalize_emails(raw_emails)
+
+    invalid_emails = sum(map(bool, map(str.strip, raw_emails))) - sum(map(bool, emails))
+    if invalid_emails:
+        print(f"⚠️ {invalid_emails} invalid email(s) in tab '{tab}'")
+
+    plan = []
+    for name, phone, email in zip(names, phones, emails):
+        key = (phone, email)
+        if (phone or email) and key not in seen:
+            seen.add(key)
+            plan.append(Recipient(name, phone, email, tab))
+    return plan
@@ -0,0 +1,124 @@
+# ratelimit.py
+import asyncio
+import os
+import threading
+import time
+import email.utils
+
+# --- CONFIGURATION ---
+# Messages per second + burst size for each provider.
+# Meta Cloud API starts at 80 msg/s per phone number; Brevo depends on the plan.
+PROVIDER_LIMITS = {
+    "whatsapp": (float(os.getenv("WHATSAPP_RATE_PER_SEC", "40")), int(os.getenv("WHATSAPP_BURST", "40"))),
+    "brevo": (float(os.getenv("BREVO_RATE_PER_SEC", "10")), int(os.getenv("BREVO_BURST", "20"))),
+}
+
+# How many times a throttled request is retried before counting as a failure
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "3"))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every sender of one provider.
+
+    The rate adapts to the provider: it is halved (and sending pauses) whenever a
+    rate-limit response comes back, then climbs back up slowly on every success.
+    """
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = max(rate / 20, 0.5)
+        self.rate = rate
+        self.burst = burst
+
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """
+        Takes a token if one is available. Returns 0 on success, otherwise the
+        number of seconds to wait before trying again.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Like acquire(), but waits without blocking the event loop."""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def on_rate_limited(self, retry_after=None):
+        """
+        Called when the provider answered with a rate-limit error.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self.paused_until = max(self.paused_until, now + pause)
+        print(f"🐢 {self.name} rate limit hit: slowing down to {self.rate:.1f} msg/s (pause {pause:.1f}s)")
+
+    def on_success(self):
+        """
+        Called after an accepted request: slowly climbs back to the configured rate.
+        """
+        if self.rate >= self.max_rate:
+            return
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider):
+    """
+    Returns the process-wide limiter for a provider ("whatsapp" or "brevo").
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            rate, burst = PROVIDER_LIMITS[provider]
+            _limiters[provider] = TokenBucket(provider, rate, burst)
+        return _limiters[provider]
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header (seconds or HTTP date). Returns seconds or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -1,12 +1,27 @@
 # services.py
+import asyncio
 import os
-import datetime
 import json
-import requests
+import threading
+import time
+import connections
+import async_transport
+from async_transport import ASYNC_TRANSPORT
 import gspread
+from gspread.utils import absolute_range_name
 from oauth2client.service_account import ServiceAccountCredentials
 from dotenv import load_dotenv
-from groq import Groq
+from groq import Groq, AsyncGroq
+from contact_cache import load_snapshot, save_snapshot, fresh_snapshot_tabs
+from llm_cache import reply_cache, semantic_cache
+from email_template import render_blast_email, render_blast_email_with_placeholder
+from normalize import build_send_plan
+from memory import conversations
+from llm_gateway import (
+    LLMGateway, CircuitBreaker, LLM_MAX_IN_FLIGHT, LLM_TIMEOUT, LLM_SLOT_WAIT,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN,
+)
+from ratelimit import get_limiter, parse_retry_after, RATE_LIMIT_RETRIES
 
 load_dotenv()
 # --- CONFIGURATION ---
@@ -19,134 +34,399 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 
 groq_client = Groq(api_key=GROQ_API_KEY)
+# Every LLM call goes through the gateway (concurrency cap, deadline, circuit breaker)
+llm_gateway = LLMGateway(
+    groq_client, LLM_MAX_IN_FLIGHT, LLM_TIMEOUT, LLM_SLOT_WAIT,
+    CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN),
+    async_client=AsyncGroq(api_key=GROQ_API_KEY) if ASYNC_TRANSPORT else None,
+)
+
+# Graph API error codes that mean "slow down" for the whole phone number (rate / throughput limits)
+WHATSAPP_THROTTLE_CODES = {4, 80007, 130429}
+# Pair rate limit: too many messages to ONE recipient. Only that message waits and is
+# retried, the shared rate stays as is. (131048, the spam rate limit, is never retried.)
+WHATSAPP_PAIR_RATE_CODE = 131056
+WHATSAPP_PAIR_RATE_BACKOFF = float(os.getenv("WHATSAPP_PAIR_RATE_BACKOFF", "6"))  # Seconds, grows per retry
+
+# What a throttled response slows down
+THROTTLE_PROVIDER = "provider"  # Every sender of the provider (shared limiter)
+THROTTLE_RECIPIENT = "recipient"  # Only the message to this recipient
+
+def _whatsapp_throttle_scope(response):
+    if response.status_code == 429:
+        return THROTTLE_PROVIDER
+    try:
+        error_code = response.json().get("error", {}).get("code")
+    except ValueError:
+        return None
+    if error_code in WHATSAPP_THROTTLE_CODES:
+        return THROTTLE_PROVIDER
+    if error_code == WHATSAPP_PAIR_RATE_CODE:
+        return THROTTLE_RECIPIENT
+    return None
+
+def _brevo_throttle_scope(response):
+    return THROTTLE_PROVIDER if response.status_code == 429 else None
 
-def get_google_sheet_contacts(sheet_url, target_tabs=[]):
+def _retry_after(response):
+    # Brevo sends the seconds until the window resets in its own header
+    return parse_retry_after(response.headers.get("Retry-After") or response.headers.get("x-sib-ratelimit-reset"))
+
+def _throttle_backoff(provider, limiter, scope, response, attempt):
     """
-    Extracts contacts. 
-    If target_tabs is empty or contains "ALL", it gets everything.
-    Otherwise, it only processes tabs named in target_tabs.
+    Handles a throttled response. Returns the seconds to wait before retrying,
+    or None when the retries are used up.
     """
-    try:
-        # 1. AUTHENTICATION
-        json_creds = os.getenv("GOOGLE_CREDENTIALS")
-        if not json_creds:
-            if os.path.exists("credentials.json"):
-                with open("credentials.json", "r") as f:
-                    json_creds = f.read()
-            else:
+    retry_after = _retry_after(response)
+    if scope == THROTTLE_PROVIDER:
+        limiter.on_rate_limited(retry_after)  # The limiter pause does the waiting
+        wait = 0
+    else:
+        wait = retry_after if retry_after is not None else WHATSAPP_PAIR_RATE_BACKOFF * (attempt + 1)
+
+    if attempt >= RATE_LIMIT_RETRIES:
+        print(f"⛔ {provider} still throttled ({scope}) after {RATE_LIMIT_RETRIES} retries, giving up")
+        return None
+    print(f"🔁 {provider} throttled ({scope}), retry {attempt + 1}/{RATE_LIMIT_RETRIES}")
+    return wait
+
+def _post_rate_limited(provider, throttle_scope, url, **kwargs):
+    """
+    POSTs through the shared rate limiter of the provider ("whatsapp" / "brevo").
+    Throttled requests are retried (see _throttle_backoff); returns the last response.
+    """
+    limiter = get_limiter(provider)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        limiter.acquire()
+        response = connections.post(url, **kwargs)
+        scope = throttle_scope(response)
+        if not scope:
+            if response.status_code < 400:
+                limiter.on_success()
+            return response
+        wait = _throttle_backoff(provider, limiter, scope, response, attempt)
+        if wait is None:
+            break
+        if wait:
+            time.sleep(wait)
+    return response
+
+async def _post_rate_limited_async(provider, throttle_scope, url, **kwargs):
+    """
+    Awaitable _post_rate_limited() for the async transport (same limiter, same retries).
+    """
+    limiter = get_limiter(provider)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        await limiter.acquire_async()
+        response = await async_transport.post(url, **kwargs)
+        scope = throttle_scope(response)
+        if not scope:
+            if response.status_code < 400:
+                limiter.on_success()
+            return response
+        wait = _throttle_backoff(provider, limiter, scope, response, attempt)
+        if wait is None:
+            break
+        if wait:
+            await asyncio.sleep(wait)
+    return response
+
+# --- GOOGLE SHEETS CLIENT CACHE ---
+# Authorizing + opening the spreadsheet costs an OAuth exchange and a metadata call,
+# so we do it once per process. The authorized session refreshes its own access
+# token when it expires; after an API error the cache is dropped and rebuilt.
+SHEETS_SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+SHEET_TITLES_TTL = int(os.getenv("SHEET_TITLES_TTL", "30"))
+# How many tabs are fetched per values:batchGet while streaming contacts
+SHEET_BATCH_TABS = int(os.getenv("SHEET_BATCH_TABS", "10"))
+
+_sheets_client = None
+_spreadsheets = {}  # sheet_url -> gspread.Spreadsheet
+_sheet_titles = {}  # sheet_url -> (titles, expires_at)
+_sheets_lock = threading.Lock()
+
+def _load_google_credentials():
+    """
+    Returns the service account JSON (env var first, then local credentials.json).
+    """
+    json_creds = os.getenv("GOOGLE_CREDENTIALS")
+    if not json_creds and os.path.exists("credentials.json"):
+        with open("credentials.json", "r") as f:
+            json_creds = f.read()
+    return json_creds
+
+def get_sheets_client():
+    """
+    Returns the process-wide authorized gspread client (None if no credentials).
+    """
+    global _sheets_client
+    with _sheets_lock:
+        if _sheets_client is None:
+            json_creds = _load_google_credentials()
+            if not json_creds:
                 return None
-        
-        creds_dict = json.loads(json_creds)
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        
-        spreadsheet = client.open_by_url(sheet_url)
-        all_contacts = []
-        seen_contacts = set()
-        
-        worksheets = spreadsheet.worksheets()
-        print(f"📊 Found {len(worksheets)} sheets. Filtering for: {target_tabs}")
-
-        for sheet in worksheets:
-            # --- NEW FILTERING LOGIC ---
-            # If target_tabs has data AND "ALL" is not in it...
-            if target_tabs and "ALL" not in target_tabs:
-                # If this sheet's name is NOT in the target list, skip it.
-                if sheet.title not in target_tabs:
-                    print(f"⏭️ Skipping tab '{sheet.title}' (Not selected)")
-                    continue
-            # ---------------------------
-
-            try:
-                records = sheet.get_all_records()
-                if not records: continue
-
-                # 4. SMART COLUMN MAPPING
-                # We need to find which key corresponds to Phone, Email, Name in THIS specific tab
-                headers = list(records[0].keys())
-                
-                # Define possible aliases (lowercase for easier matching)
-                phone_aliases = ['phone', 'mobile', 'usdlk', 'contact', 'contact number', 'corporate phone']
-                email_aliases = ['email', 'email ids', 'email id', 'email address']
-                name_aliases = ['name', 'company name', 'company', 'brand', 'first name']
-
-                # Find the actual column name used in this sheet
-                phone_key = next((h for h in headers if h.lower() in phone_aliases), None)
-                email_key = next((h for h in headers if h.lower() in email_aliases), None)
-                name_key = next((h for h in headers if h.lower() in name_aliases), None)
-
-                for row in records:
-                    # Extract using the found keys
-                    phone = str(row.get(phone_key, '')).strip() if phone_key else ""
-                    email = str(row.get(email_key, '')).strip() if email_key else ""
-                    name = str(row.get(name_key, '')).strip() if name_key else "Valued Customer"
-
-                    # Special Case: If name is split (First Name / Last Name), combine them
-                    if name_key and name_key.lower() == 'first name':
-                        last_name = str(row.get('Last Name', '')).strip()
-                        if last_name:
-                            name = f"{name} {last_name}"
-
-                    # Create a standardized row object
-                    clean_row = {
-                        'Phone': phone,
-                        'Email ids': email,
-                        'Name': name,
-                        'Source_Tab': sheet.title 
-                    }
-
-                    # --- UPDATED DEDUPLICATION LOGIC ---
-                    # Old way: unique_key = phone if phone else email
-                    # This caused the issue because if phone matched, it ignored different emails.
-                    
-                    # New Way: Combine Phone AND Email to make the key.
-                    # This means (Phone1, EmailA) is different from (Phone1, EmailB).
-                    unique_key = f"{phone}_{email}"
-
-                    if unique_key not in seen_contacts:
-                        seen_contacts.add(unique_key)
-                        all_contacts.append(clean_row)
-                        
-            except Exception as e:
-                print(f"⚠️ Skipped tab '{sheet.title}': {e}")
-                continue
+            creds_dict = json.loads(json_creds)
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SHEETS_SCOPE)
+            _sheets_client = gspread.authorize(creds)
+            print("🔑 Authorized Google Sheets client")
+        return _sheets_client
+
+def open_spreadsheet(sheet_url):
+    """
+    Returns the cached spreadsheet handle for a URL (None if no credentials).
+    """
+    spreadsheet = _spreadsheets.get(sheet_url)
+    if spreadsheet:
+        return spreadsheet
+
+    client = get_sheets_client()
+    if not client:
+        return None
+    spreadsheet = client.open_by_url(sheet_url)
+    with _sheets_lock:
+        _spreadsheets[sheet_url] = spreadsheet
+    return spreadsheet
 
-        print(f"✅ Extracted {len(all_contacts)} unique contacts.")
-        return all_contacts
+def reset_sheets_client():
+    """
+    Drops the cached client and handles (next call re-authorizes).
+    """
+    global _sheets_client
+    with _sheets_lock:
+        _sheets_client = None
+        _spreadsheets.clear()
+        _sheet_titles.clear()
+
+def _values_to_records(values):
+    """
+    Turns raw tab values (first row = headers) into a list of dicts,
+    the same shape gspread's get_all_records() returns.
+    """
+    if len(values) < 2:
+        return []
+    headers = [str(h) for h in values[0]]
+    width = len(headers)
+    return [dict(zip(headers, row + [''] * (width - len(row)))) for row in values[1:]]
 
+def _map_tab_contacts(title, records):
+    """
+    Maps one tab's records to standardized {Phone, Email ids, Name, Source_Tab} rows.
+    """
+    if not records:
+        return []
+
+    # SMART COLUMN MAPPING
+    # We need to find which key corresponds to Phone, Email, Name in THIS specific tab
+    headers = list(records[0].keys())
+    
+    # Define possible aliases (lowercase for easier matching)
+    phone_aliases = ['phone', 'mobile', 'usdlk', 'contact', 'contact number', 'corporate phone']
+    email_aliases = ['email', 'email ids', 'email id', 'email address']
+    name_aliases = ['name', 'company name', 'company', 'brand', 'first name']
+
+    # Find the actual column name used in this sheet
+    phone_key = next((h for h in headers if h.lower() in phone_aliases), None)
+    email_key = next((h for h in headers if h.lower() in email_aliases), None)
+    name_key = next((h for h in headers if h.lower() in name_aliases), None)
+
+    contacts = []
+    for row in records:
+        # Extract using the found keys
+        phone = str(row.get(phone_key, '')).strip() if phone_key else ""
+        email = str(row.get(email_key, '')).strip() if email_key else ""
+        name = str(row.get(name_key, '')).strip() if name_key else "Valued Customer"
+
+        # Special Case: If name is split (First Name / Last Name), combine them
+        if name_key and name_key.lower() == 'first name':
+            last_name = str(row.get('Last Name', '')).strip()
+            if last_name:
+                name = f"{name} {last_name}"
+
+        # Create a standardized row object
+        contacts.append({
+            'Phone': phone,
+            'Email ids': email,
+            'Name': name,
+            'Source_Tab': title
+        })
+    return contacts
+
+def _get_modified_time(spreadsheet):
+    """
+    Drive modifiedTime of the spreadsheet (changes on every edit), or None if unavailable.
+    """
+    try:
+        return spreadsheet.get_lastUpdateTime()
     except Exception as e:
-        print(f"Google Sheet Error: {e}")
+        print(f"⚠️ Could not read sheet modifiedTime (cache disabled for this read): {e}")
         return None
+
+def iter_google_sheet_contacts(sheet_url, target_tabs=[], on_tab_loaded=None):
+    """
+    Streams the send plan tab by tab (normalize.Recipient rows: cleaned name, phone and
+    email, deduplicated), so sending can start as soon as the first tab is ready.
+    If target_tabs is empty or contains "ALL", it gets everything.
+    Otherwise, it only processes tabs named in target_tabs.
+    - on_tab_loaded: optional callback(title, planned_rows) called before a tab's rows are yielded.
+    Raises on Sheets errors (the caller resets the client, see reset_sheets_client).
+    """
+    # 1. AUTHENTICATION (Cached client + spreadsheet, see open_spreadsheet)
+    spreadsheet = open_spreadsheet(sheet_url)
+    if not spreadsheet:
+        raise RuntimeError("No Google credentials configured")
+    seen_contacts = set()  # Normalized (phone, email) pairs of every tab streamed so far
+    total = 0
+    
+    # 2. PICK THE TABS (Tab list comes from the cache, see get_sheet_titles)
+    all_titles = get_sheet_titles(sheet_url)
+    print(f"📊 Found {len(all_titles)} sheets. Filtering for: {target_tabs}")
+
+    tab_titles = []
+    for title in all_titles:
+        # --- NEW FILTERING LOGIC ---
+        # If target_tabs has data AND "ALL" is not in it...
+        if target_tabs and "ALL" not in target_tabs:
+            # If this sheet's name is NOT in the target list, skip it.
+            if title not in target_tabs:
+                print(f"⏭️ Skipping tab '{title}' (Not selected)")
+                continue
+        # ---------------------------
+        tab_titles.append(title)
+
+    # 3. LOCAL SNAPSHOTS (Reused while the file's Drive modifiedTime is unchanged)
+    # Only the list of fresh tabs is read up front; each snapshot is loaded when its turn comes
+    modified_time = _get_modified_time(spreadsheet)
+    cached_tabs = fresh_snapshot_tabs(spreadsheet.id, modified_time) & set(tab_titles)
+    if cached_tabs:
+        print(f"💾 Using cached snapshot for {len(cached_tabs)} tab(s)")
+
+    tab_contacts = {}  # Tabs fetched from the API but not streamed yet (at most one batch)
+    for index, title in enumerate(tab_titles):
+        if title in cached_tabs and title not in tab_contacts:
+            snapshot = load_snapshot(spreadsheet.id, title, modified_time)
+            if snapshot is not None:
+                tab_contacts[title] = snapshot
+            else:
+                cached_tabs.discard(title)  # Replaced since we listed it, read it from the sheet
+
+        # 4. BATCHED READS: when we reach a tab that isn't loaded yet, fetch it together
+        # with the next few missing tabs in one values:batchGet (SHEET_BATCH_TABS per call)
+        if title not in tab_contacts:
+            batch = [t for t in tab_titles[index:] if t not in tab_contacts and t not in cached_tabs][:SHEET_BATCH_TABS]
+            _load_tabs(spreadsheet, batch, modified_time, tab_contacts)
+
+        # Drop the tab from memory as soon as it has been streamed
+        contacts = tab_contacts.pop(title, [])
+
+        # 5. NORMALIZATION + DEDUPLICATION (whole tab at once, see normalize.py)
+        # The key is the cleaned (Phone, Email) pair, so (Phone1, EmailA) is still
+        # different from (Phone1, EmailB), but "098765-43210" == "+91 98765 43210".
+        plan = build_send_plan(title, contacts, seen_contacts)
+
+        total += len(plan)
+        if on_tab_loaded:
+            on_tab_loaded(title, len(plan))
+        yield from plan
+
+    print(f"✅ Extracted {total} unique contacts.")
+
+def _load_tabs(spreadsheet, titles, modified_time, tab_contacts):
+    """
+    Reads several tabs in ONE values:batchGet call and stores the mapped contacts in tab_contacts.
+    """
+    # Tab names must be quoted in A1 notation ('My Tab'!)
+    response = spreadsheet.values_batch_get([absolute_range_name(title) for title in titles])
+    value_ranges = response.get("valueRanges", [])
+
+    for title, value_range in zip(titles, value_ranges):
+        try:
+            records = _values_to_records(value_range.get("values", []))
+            tab_contacts[title] = _map_tab_contacts(title, records)
+            save_snapshot(spreadsheet.id, title, modified_time, tab_contacts[title])
+        except Exception as e:
+            print(f"⚠️ Skipped tab '{title}': {e}")
+            tab_contacts[title] = []
+
+# --- IMAGE CHECK CACHE ---
+# The blast image is the same for every recipient, so we check each URL once
+# and remember the answer. Failures are remembered only briefly, so a fixed
+# image can be re-tried right away.
+IMAGE_CHECK_TTL = int(os.getenv("IMAGE_CHECK_TTL", "600"))
+IMAGE_CHECK_FAIL_TTL = 30
+_image_checks = {}  # url -> (is_ok, expires_at)
+_image_checks_lock = threading.Lock()
+
 def validate_image_url(url):
     """
-    Checks if an image URL is publicly accessible.
+    Checks if an image URL is publicly accessible (cached per URL, see IMAGE_CHECK_TTL).
     """
     if not url: return True # Empty is fine (text only)
+
+    # Held during the check so parallel senders don't all check the same URL
+    with _image_checks_lock:
+        cached = _image_checks.get(url)
+        if cached and cached[1] > time.time():
+            return cached[0]
+
+        is_ok = _check_image_url(url)
+        ttl = IMAGE_CHECK_TTL if is_ok else IMAGE_CHECK_FAIL_TTL
+        _image_checks[url] = (is_ok, time.time() + ttl)
+        return is_ok
+
+def _check_image_url(url):
     try:
         # We try to just 'head' the URL to check status without downloading content
-        response = requests.head(url, timeout=5)
-        if response.status_code == 200:
-            return True
-        # Some servers don't support HEAD, so try GET
-        response = requests.get(url, timeout=5)
+        response = connections.head(url, timeout=5)
         if response.status_code == 200:
             return True
-        return False
+        # Some servers don't support HEAD, so try GET (streamed, we only need the status)
+        with connections.get(url, timeout=5, stream=True) as response:
+            return response.status_code == 200
     except:
         return False
     
-def send_whatsapp_template(to_number, user_name, custom_message, image_url=None):
+def send_whatsapp_template(to_number, user_name, custom_message, image_url=None, image_checked=False):
     """
     Sends a WhatsApp template with 2 variables: {{1}}=Name, {{2}}=Message.
     - If image_url exists -> uses 'promo_with_image' (Header Image + Body).
     - If no image -> uses 'promo_text_v2' (Text Body + Buttons).
+    - image_checked: the caller already ran validate_image_url (blasts check it once, up front).
     """
-    
-    if image_url and not validate_image_url(image_url):
+    if ASYNC_TRANSPORT:
+        return async_transport.run_sync(
+            send_whatsapp_template_async(to_number, user_name, custom_message, image_url, image_checked))
+
+    if image_url and not image_checked and not validate_image_url(image_url):
         print(f"❌ Image Error: URL is not accessible ({image_url})")
         return 400, {"error": "Invalid or Private Image URL"}
-    
+
+    url, payload, headers = _whatsapp_template_request(to_number, user_name, custom_message, image_url)
+    try:
+        response = _post_rate_limited("whatsapp", _whatsapp_throttle_scope, url, json=payload, headers=headers)
+        return response.status_code, response.json()
+    except Exception as e:
+        return 500, str(e)
+
+async def send_whatsapp_template_async(to_number, user_name, custom_message, image_url=None, image_checked=False):
+    """
+    send_whatsapp_template() on the async transport, same return value.
+    """
+    # The check is blocking I/O, so it never runs on the event loop itself
+    if image_url and not image_checked and not await asyncio.to_thread(validate_image_url, image_url):
+        print(f"❌ Image Error: URL is not accessible ({image_url})")
+        return 400, {"error": "Invalid or Private Image URL"}
+
+    url, payload, headers = _whatsapp_template_request(to_number, user_name, custom_message, image_url)
+    try:
+        response = await _post_rate_limited_async("whatsapp", _whatsapp_throttle_scope, url, json=payload, headers=headers)
+        return response.status_code, response.json()
+    except Exception as e:
+        return 500, str(e)
+
+def _whatsapp_template_request(to_number, user_name, custom_message, image_url):
+    """
+    Returns (url, payload, headers) of a template message.
+    """
     url = f"https://graph.facebook.com/v21.0/{PHONE_NUMBER_ID}/messages"
     headers = {
         "Authorization": f"Bearer {META_TOKEN}",
@@ -195,261 +475,205 @@ def send_whatsapp_template(to_number, user_name, custom_message, image_url=None)
             "components": components
         }
     }
-    
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        return response.status_code, response.json()
-    except Exception as e:
-        return 500, str(e)
+    return url, payload, headers
 
 def send_brevo_email(to_email, subject, body_text, user_name="Valued Customer"):
     """
     Sends a Professional HTML email via Brevo.
     """
-    api_key = os.getenv("BREVO_API_KEY")
-    sender_email = os.getenv("SENDER_EMAIL", "services@shoutotb.com")
-    
-    if not api_key:
-        print("❌ Error: BREVO_API_KEY not found.")
+    if ASYNC_TRANSPORT:
+        return async_transport.run_sync(send_brevo_email_async(to_email, subject, body_text, user_name))
+
+    request = _brevo_email_request(to_email, subject, body_text, user_name)
+    if not request:
+        return False
+    url, payload, headers = request
+    try:
+        response = _post_rate_limited("brevo", _brevo_throttle_scope, url, json=payload, headers=headers, timeout=10) # Added timeout
+        return _brevo_email_result(to_email, response)
+    except Exception as e:
+        print(f"📧 Connection Error: {e}")
         return False
 
-    # Validation Guard
-    if not to_email or "@" not in to_email:
-        print(f"❌ Brevo Skip: Invalid email address '{to_email}'")
+async def send_brevo_email_async(to_email, subject, body_text, user_name="Valued Customer"):
+    """
+    send_brevo_email() on the async transport, same return value.
+    """
+    request = _brevo_email_request(to_email, subject, body_text, user_name)
+    if not request:
+        return False
+    url, payload, headers = request
+    try:
+        response = await _post_rate_limited_async("brevo", _brevo_throttle_scope, url, json=payload, headers=headers, timeout=10)
+        return _brevo_email_result(to_email, response)
+    except Exception as e:
+        print(f"📧 Connection Error: {e}")
         return False
 
-    url = "https://api.brevo.com/v3/smtp/email"
-    
-    headers = {
+def _brevo_email_result(to_email, response):
+    if response.status_code == 201:
+        return True
+    # Print the exact error from Brevo
+    print(f"📧 Brevo Error for {to_email}: {response.text}")
+    return False
+
+BREVO_URL = "https://api.brevo.com/v3/smtp/email"
+# Brevo template variable replaced by each messageVersion's params (see batch sending)
+BREVO_NAME_PARAM = "{{params.user_name}}"
+
+def _brevo_headers():
+    """
+    Returns the request headers, or None if no API key is configured.
+    """
+    api_key = os.getenv("BREVO_API_KEY")
+    if not api_key:
+        print("❌ Error: BREVO_API_KEY not found.")
+        return None
+    return {
         "accept": "application/json",
         "api-key": api_key,
         "content-type": "application/json"
     }
 
-    formatted_body = body_text.replace("\n", "<br>")
-    current_year = datetime.datetime.now().year
-
-    # --- HTML TEMPLATE START ---
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Shout OTB Notification</title>
-        <style>
-            /* --- RESET & BASE --- */
-            * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-            body {{
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                background-color: #f5f5f5;
-                color: #333;
-                line-height: 1.5;
-                margin: 0;
-                padding: 0;
-            }}
-            .email-container {{
-                max-width: 600px;
-                margin: 0 auto;
-                background-color: #ffffff;
-                border-radius: 12px;
-                overflow: hidden;
-                box-shadow: 0 10px 40px rgba(0, 0, 0, 0.08);
-            }}
-            .email-header {{
-                background: linear-gradient(135deg, #090909 0%, #1e1e1e 100%);
-                padding: 30px 20px;
-                text-align: center;
-                color: white;
-            }}
-            .branding-container {{ margin-bottom: 10px; }}
-            .logo-img {{
-                vertical-align: middle;
-                width: 50px;
-                height: auto;
-                margin-right: 10px;
-                border-radius: 8px;
-            }}
-            .logo-text {{
-                font-size: 26px;
-                color: #f33c52;
-                font-weight: 800;
-                letter-spacing: -0.5px;
-                vertical-align: middle;
-                display: inline-block;
-            }}
-            .email-title {{
-                font-size: 20px;
-                color: #fff;
-                margin-top: 5px;
-                font-weight: 600;
-                opacity: 0.9;
-            }}
-            .email-content {{
-                padding: 30px 20px;
-                background-color: #f9f9f9;
-                color: #333;
-            }}
-            .greeting {{
-                font-size: 16px;
-                color: #f33c52;
-                margin-bottom: 15px;
-                font-weight: 600;
-            }}
-            .message-content {{
-                font-size: 15px;
-                line-height: 1.6;
-                margin-bottom: 20px;
-            }}
-            .email-footer {{
-                background-color: #f9f9f9;
-                padding: 30px 20px;
-                text-align: center;
-            }}
-            .footer-grid {{
-                text-align: center;
-                padding: 10px 0;
-            }}
-            .footer-pill {{
-                display: inline-block;
-                vertical-align: top;
-                width: 140px;
-                background: #ffffff;
-                border: 1px solid #e0e0e0;
-                border-radius: 12px;
-                padding: 15px 10px;
-                margin: 5px;
-                text-align: center;
-                text-decoration: none;
-                transition: all 0.3s ease;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.03);
-            }}
-            .footer-pill:hover {{
-                transform: translateY(-2px);
-                border-color: #f33c52;
-                box-shadow: 0 5px 15px rgba(243, 60, 82, 0.15);
-            }}
-            .pill-icon {{
-                font-size: 22px;
-                display: block;
-                margin-bottom: 8px;
-            }}
-            .pill-title {{
-                color: #f33c52;
-                font-size: 11px;
-                text-transform: uppercase;
-                letter-spacing: 1px;
-                font-weight: 700;
-                display: block;
-                margin-bottom: 4px;
-            }}
-            .pill-link {{
-                color: #333;
-                font-size: 13px;
-                text-decoration: none;
-                display: block;
-                white-space: nowrap;
-                overflow: hidden;
-                text-overflow: ellipsis;
-                font-weight: 500;
-            }}
-            .no-reply-note {{
-                font-size: 12px;
-                color: #555;
-                margin-top: 25px;
-                margin-bottom: 5px;
-                font-style: italic;
-                letter-spacing: 0.3px;
-            }}
-            .copyright {{
-                font-size: 12px;
-                color: #888;
-                margin-top: 25px;
-                padding-top: 20px;
-                border-top: 1px solid #e0e0e0;
-            }}
-            @media (max-width: 480px) {{
-                .footer-pill {{
-                    width: 100%;
-                    display: block;
-                    margin: 10px 0;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="email-container">
-            <div class="email-header">
-                <div class="branding-container">
-                    <img src="https://res.cloudinary.com/dru5oqalj/image/upload/w_80,h_80,c_pad,b_transparent,f_auto,q_auto/v1764500530/Asset_22_dbva0l.png" 
-                         alt="Logo" class="logo-img" width="50" height="50">
-                    <span class="logo-text">SHOUT OTB</span>
-                </div>
-                
-                <h2 class="email-title">Greetings {user_name}! 👋</h2>
-                
-            </div>
-            
-            <div class="email-content">
-                <div class="greeting">Hello {user_name},</div>
-                <div class="message-content">
-                    {formatted_body}
-                </div>
-            </div>
-            
-            <div class="email-footer">
-                <div class="footer-grid">
-                    <a href="mailto:services@shoutotb.com" class="footer-pill">
-                        <span class="pill-icon">✉️</span>
-                        <span class="pill-title">Email</span>
-                        <span class="pill-link">services@shoutotb.com</span>
-                    </a>
-                    <a href="tel:+919752000546" class="footer-pill">
-                        <span class="pill-icon">📞</span>
-                        <span class="pill-title">Phone</span>
-                        <span class="pill-link">+91 97520 00546</span>
-                    </a>
-                    <a href="https://shoutotb.com" class="footer-pill">
-                        <span class="pill-icon">🌐</span>
-                        <span class="pill-title">Website</span>
-                        <span class="pill-link">shoutotb.com</span>
-                    </a>
-                </div>
-                
-                <div class="no-reply-note">
-                    This is an automated notification. Please do not reply directly to this email.
-                </div>
-                
-                <div class="copyright">
-                    © {current_year} Shout OTB. All rights reserved.
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    # --- HTML TEMPLATE END ---
+def _brevo_sender():
+    return {"name": "Shout OTB Team", "email": os.getenv("SENDER_EMAIL", "services@shoutotb.com")}
+
+def _is_valid_email(to_email):
+    # Validation Guard
+    if not to_email or "@" not in to_email:
+        print(f"❌ Brevo Skip: Invalid email address '{to_email}'")
+        return False
+    return True
+
+def _brevo_email_request(to_email, subject, body_text, user_name):
+    """
+    Returns (url, payload, headers) of the email, or None if it can't be sent.
+    """
+    headers = _brevo_headers()
+    if not headers or not _is_valid_email(to_email):
+        return None
 
     payload = {
-        "sender": {"name": "Shout OTB Team", "email": sender_email},
+        "sender": _brevo_sender(),
         "to": [{"email": to_email, "name": user_name}],
         "subject": subject,
-        "htmlContent": html_content
+        "htmlContent": render_blast_email(user_name, body_text)
     }
+    return BREVO_URL, payload, headers
 
+# --- BREVO BATCH SENDING ---
+# One /v3/smtp/email call carries up to BREVO_BATCH_SIZE personalized emails
+# (messageVersions), instead of one call per recipient. 1 = no batching.
+# The HTML is sent once per call: every version only carries its address and its
+# params (Brevo fills {{params.user_name}} in, escaped, for each recipient).
+BREVO_BATCH_SIZE = int(os.getenv("BREVO_BATCH_SIZE", "100"))
+
+def send_brevo_email_batch(recipients, subject, body_text):
+    """
+    Sends the same email, personalized with each recipient's name, with a single Brevo call.
+    - recipients: list of (to_email, user_name).
+    - subject: may contain "{user_name}".
+    Returns one bool per recipient, in the same order. Invalid addresses are False
+    on their own. If Brevo rejects the whole batch (400, e.g. one malformed address),
+    the batch is sent again one email at a time, so one bad row can't fail the others.
+    Any other error (5xx, timeout) counts as a failure for the whole batch: Brevo
+    doesn't say which versions it accepted, so a resumed blast may send those again.
+    """
+    if ASYNC_TRANSPORT:
+        return async_transport.run_sync(send_brevo_email_batch_async(recipients, subject, body_text))
+
+    request, results = _brevo_batch_request(recipients, subject, body_text)
+    if not request:
+        return results
+    url, payload, headers, indexes = request
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10) # Added timeout
-        
-        if response.status_code == 201:
-            return True
-        else:
-            # Print the exact error from Brevo
-            print(f"📧 Brevo Error for {to_email}: {response.text}")
-            return False
-            
+        response = _post_rate_limited("brevo", _brevo_throttle_scope, url, json=payload, headers=headers, timeout=30)
     except Exception as e:
-        print(f"📧 Connection Error: {e}")
-        return False
+        print(f"📧 Connection Error (batch of {len(indexes)}): {e}")
+        return results
+
+    if response.status_code == 400:
+        print(f"📧 Brevo rejected a batch of {len(indexes)}, sending one by one: {response.text}")
+        for i in indexes:
+            to_email, user_name = recipients[i]
+            results[i] = send_brevo_email(to_email, _personal_subject(subject, user_name), body_text, user_name)
+        return results
+
+    ok = _brevo_batch_result(len(indexes), response)
+    for i in indexes:
+        results[i] = ok
+    return results
+
+async def send_brevo_email_batch_async(recipients, subject, body_text):
+    """
+    send_brevo_email_batch() on the async transport, same return value.
+    """
+    request, results = _brevo_batch_request(recipients, subject, body_text)
+    if not request:
+        return results
+    url, payload, headers, indexes = request
+    try:
+        response = await _post_rate_limited_async("brevo", _brevo_throttle_scope, url, json=payload, headers=headers, timeout=30)
+    except Exception as e:
+        print(f"📧 Connection Error (batch of {len(indexes)}): {e}")
+        return results
+
+    if response.status_code == 400:
+        print(f"📧 Brevo rejected a batch of {len(indexes)}, sending one by one: {response.text}")
+        sent = await asyncio.gather(*(
+            send_brevo_email_async(recipients[i][0], _personal_subject(subject, recipients[i][1]), body_text, recipients[i][1])
+            for i in indexes
+        ))
+        for i, ok in zip(indexes, sent):
+            results[i] = ok
+        return results
+
+    ok = _brevo_batch_result(len(indexes), response)
+    for i in indexes:
+        results[i] = ok
+    return results
+
+def _personal_subject(subject, user_name):
+    return subject.replace("{user_name}", user_name)
+
+def _brevo_batch_request(recipients, subject, body_text):
+    """
+    Returns ((url, payload, headers, indexes), results). indexes are the recipients that
+    made it into the payload; results start as all False (the request is None if
+    nothing can be sent).
+    """
+    results = [False] * len(recipients)
+    headers = _brevo_headers()
+    if not headers:
+        return None, results
+
+    versions = []
+    indexes = []
+    for i, (to_email, user_name) in enumerate(recipients):
+        if not _is_valid_email(to_email):
+            continue
+        indexes.append(i)
+        versions.append({
+            "to": [{"email": to_email, "name": user_name}],
+            "params": {"user_name": user_name},
+        })
+    if not versions:
+        return None, results
+
+    payload = {
+        "sender": _brevo_sender(),
+        "subject": _personal_subject(subject, BREVO_NAME_PARAM),
+        "htmlContent": render_blast_email_with_placeholder(body_text, BREVO_NAME_PARAM),
+        "messageVersions": versions,
+    }
+    return (BREVO_URL, payload, headers, indexes), results
+
+def _brevo_batch_result(count, response):
+    if response.status_code == 201:
+        return True
+    # Print the exact error from Brevo
+    print(f"📧 Brevo Error for a batch of {count}: {response.text}")
+    return False
 
 # --- THE MASTER PROMPT ---
 # This variable holds all the knowledge the bot needs about Shout OTB.
@@ -502,56 +726,143 @@ architectural Walkthroughs
 Now, reply to the user based on these rules.
 """
 
-def get_groq_response(user_text):
+LLM_MODEL = "llama-3.3-70b-versatile"
+LLM_FALLBACK_REPLY = "I'm having trouble connecting right now. Please call us directly at +91 9752000546."
+
+def get_groq_response(user_text, phone=None):
+    """
+    Answers a customer message with the LLM.
+    With a phone number, the recent turns of that chat are sent along (see memory.py).
+    """
+    if ASYNC_TRANSPORT:
+        return async_transport.run_sync(get_groq_response_async(user_text, phone))
+
+    history = conversations.history(phone) if phone else []
+    # The caches only hold context-free answers: used until the chat has an LLM answer in it
+    cacheable = not (phone and conversations.has_llm_turns(phone))
+    cached_reply = _cached_llm_reply(user_text, phone, cacheable)
+    if cached_reply is not None:
+        return cached_reply
+
     try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": SYSTEM_PROMPT  # <--- WE INJECT THE KNOWLEDGE HERE
-                },
-                {
-                    "role": "user",
-                    "content": user_text,
-                }
-            ],
-            model="llama-3.3-70b-versatile",
-        )
-        return chat_completion.choices[0].message.content
+        reply = llm_gateway.chat(messages=_llm_messages(user_text, history), model=LLM_MODEL)
     except Exception as e:
         print(f"Groq Error: {e}")
-        return "I'm having trouble connecting right now. Please call us directly at +91 9752000546."
+        return LLM_FALLBACK_REPLY
+    _remember_llm_reply(user_text, phone, cacheable, reply)
+    return reply
+
+async def get_groq_response_async(user_text, phone=None):
+    """
+    get_groq_response() on the async transport, same return value.
+    """
+    history = conversations.history(phone) if phone else []
+    # The caches only hold context-free answers: used until the chat has an LLM answer in it
+    cacheable = not (phone and conversations.has_llm_turns(phone))
+    cached_reply = _cached_llm_reply(user_text, phone, cacheable)
+    if cached_reply is not None:
+        return cached_reply
+
+    try:
+        reply = await llm_gateway.chat_async(messages=_llm_messages(user_text, history), model=LLM_MODEL)
+    except Exception as e:
+        print(f"Groq Error: {e}")
+        return LLM_FALLBACK_REPLY
+    _remember_llm_reply(user_text, phone, cacheable, reply)
+    return reply
+
+def _cached_llm_reply(user_text, phone, cacheable):
+    if not cacheable:
+        return None
+
+    # Repeated questions are answered from the cache (no tokens, no rate limit)
+    cached_reply = reply_cache.get(user_text)
+    if cached_reply is not None:
+        print(f"⚡ LLM cache hit: {user_text[:40]!r}")
+    else:
+        # Paraphrases of an earlier question ("seo services?" ~ "do you do seo")
+        cached_reply = semantic_cache.get(user_text)
+        if cached_reply is None:
+            return None
+        print(f"⚡ LLM semantic cache hit: {user_text[:40]!r}")
+        reply_cache.put(user_text, cached_reply)
+
+    if phone:
+        conversations.add_turn(phone, user_text, cached_reply)
+    return cached_reply
+
+def _llm_messages(user_text, history):
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT  # <--- WE INJECT THE KNOWLEDGE HERE
+        },
+        *history,
+        {
+            "role": "user",
+            "content": user_text,
+        }
+    ]
+
+def _remember_llm_reply(user_text, phone, cacheable, reply):
+    # Only real answers are cached, never the fallback
+    if cacheable:
+        reply_cache.put(user_text, reply)
+        semantic_cache.put(user_text, reply)
+    if phone:
+        conversations.add_turn(phone, user_text, reply)
 
 def get_sheet_titles(sheet_url):
     """
     Returns a list of all Tab (Worksheet) names in the Google Sheet.
+    Cached for SHEET_TITLES_TTL seconds, so the tab picker loads instantly.
     """
+    cached = _sheet_titles.get(sheet_url)
+    if cached and cached[1] > time.time():
+        return list(cached[0])
+
     try:
-        json_creds = os.getenv("GOOGLE_CREDENTIALS")
-        if not json_creds:
-            # Fallback to local file
-            if os.path.exists("credentials.json"):
-                with open("credentials.json", "r") as f:
-                    json_creds = f.read()
-            else:
-                return []
+        spreadsheet = open_spreadsheet(sheet_url)
+        if not spreadsheet:
+            return []
 
-        creds_dict = json.loads(json_creds)
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        
-        spreadsheet = client.open_by_url(sheet_url)
-        return [sheet.title for sheet in spreadsheet.worksheets()]
+        titles = [sheet.title for sheet in spreadsheet.worksheets()]
+        _sheet_titles[sheet_url] = (titles, time.time() + SHEET_TITLES_TTL)
+        return list(titles)
         
     except Exception as e:
         print(f"Error fetching titles: {e}")
+        reset_sheets_client()
         return []
     
 def send_whatsapp_text(to_number, text_body):
     """
     Sends a standard text reply (Allowed only within 24h of user message).
     """
+    if ASYNC_TRANSPORT:
+        return async_transport.run_sync(send_whatsapp_text_async(to_number, text_body))
+
+    url, payload, headers = _whatsapp_text_request(to_number, text_body)
+    try:
+        response = _post_rate_limited("whatsapp", _whatsapp_throttle_scope, url, json=payload, headers=headers)
+        return response.status_code
+    except Exception as e:
+        print(f"Send Error: {e}")
+        return 500
+
+async def send_whatsapp_text_async(to_number, text_body):
+    """
+    send_whatsapp_text() on the async transport, same return value.
+    """
+    url, payload, headers = _whatsapp_text_request(to_number, text_body)
+    try:
+        response = await _post_rate_limited_async("whatsapp", _whatsapp_throttle_scope, url, json=payload, headers=headers)
+        return response.status_code
+    except Exception as e:
+        print(f"Send Error: {e}")
+        return 500
+
+def _whatsapp_text_request(to_number, text_body):
     url = f"https://graph.facebook.com/v21.0/{PHONE_NUMBER_ID}/messages"
     headers = {
         "Authorization": f"Bearer {META_TOKEN}",
@@ -564,10 +875,4 @@ def send_whatsapp_text(to_number, text_body):
         "type": "text",
         "text": {"body": text_body}
     }
-    
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        return response.status_code
-    except Exception as e:
-        print(f"Send Error: {e}")
-        return 500
\ No newline at end of file
+    return url, payload, headers
@@ -0,0 +1,32 @@
+# storage.py
+import os
+import sqlite3
+import threading
+
+# Folder for the local SQLite stores (contact snapshots, blast checkpoints, ...)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+_local = threading.local()
+
+
+def get_db(name, schema):
+    """
+    Returns this thread's connection to DATA_DIR/<name>.sqlite3.
+    The schema (CREATE ... IF NOT EXISTS statements) is applied on first use.
+    SQLite connections can't be shared between threads, so each thread gets its own.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(name)
+    if conn is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(DATA_DIR, f"{name}.sqlite3"), timeout=30)
+        conn.row_factory = sqlite3.Row
+        # WAL lets the dashboard read while a blast is writing
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(schema)
+        conns[name] = conn
+    return conn
@@ -0,0 +1,14 @@
+# conftest.py
+import os
+import sys
+import tempfile
+
+# The backend modules are imported flat ("from intents import ..."), like app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set before any backend module is imported: the SQLite stores go to a throwaway
+# folder, the provider clients get dummy keys and nothing runs on the async transport
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="blast-tests-")
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ["TRANSPORT_MODE"] = "sync"
+os.environ["STATUS_FLUSH_INTERVAL"] = "0.05"  # Delivery status writer: flush quickly
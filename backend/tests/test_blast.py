@@ -0,0 +1,99 @@
+# test_blast.py
+import threading
+import time
+import uuid
+from blast import ChannelPool, BatchChannelPool
+from checkpoints import load_sent, mark_sent
+
+
+def _stats():
+    return {"whatsapp_sent": 0, "whatsapp_fail": 0, "email_sent": 0, "email_fail": 0}
+
+def _pool(send_func, stats, blast_id=None, workers=4):
+    return ChannelPool("whatsapp", "WA", send_func, workers, stats, threading.Lock(), blast_id)
+
+
+def test_same_key_waits_for_the_one_in_flight():
+    release = threading.Event()
+    running = []
+    calls = []
+
+    def send(key, job):
+        running.append(job)
+        assert len(running) == 1, "two sends for the same key ran at the same time"
+        calls.append(job)
+        release.wait(5)
+        running.remove(job)
+        return True, None
+
+    stats = _stats()
+    pool = _pool(send, stats)
+    pool.submit("919876543210", "first")
+    pool.submit("919876543210", "second")
+    time.sleep(0.05)
+    release.set()
+    pool.close()
+
+    # The first send succeeded, so the waiting duplicate is skipped
+    assert calls == ["first"]
+    assert stats["whatsapp_sent"] == 1 and stats["whatsapp_fail"] == 0
+
+
+def test_failed_send_gives_the_waiting_duplicate_a_turn():
+    release = threading.Event()
+    calls = []
+
+    def send(key, job):
+        calls.append(job)
+        release.wait(5)
+        return (job == "second"), ("boom" if job == "first" else None)
+
+    stats = _stats()
+    pool = _pool(send, stats)
+    pool.submit("919876543210", "first")
+    pool.submit("919876543210", "second")
+    pool.submit("919876543210", "third")
+    release.set()
+    pool.close()
+
+    assert calls == ["first", "second"]
+    assert stats["whatsapp_sent"] == 1 and stats["whatsapp_fail"] == 1
+
+
+def test_resume_skips_checkpointed_recipients():
+    blast_id = uuid.uuid4().hex
+    mark_sent(blast_id, "whatsapp", "911111111111")
+    calls = []
+
+    def send(key, job):
+        calls.append(key)
+        return True, None
+
+    pool = _pool(send, _stats(), blast_id=blast_id)
+    pool.submit("911111111111", "job")
+    pool.submit("912222222222", "job")
+    pool.close()
+
+    assert calls == ["912222222222"]
+    assert load_sent(blast_id, "whatsapp") == {"911111111111", "912222222222"}
+
+
+def test_batch_pool_retries_a_failed_recipient_in_a_follow_up_batch():
+    batches = []
+
+    def send_batch(items):
+        batches.append([job for _, job in items])
+        return [(job != "a1", None) for _, job in items]
+
+    stats = _stats()
+    results = []
+    pool = BatchChannelPool("email", "Email", send_batch, 2, 1, stats, threading.Lock(),
+                            on_result=lambda channel, key, ok, error: results.append((key, ok)))
+    pool.submit("a@x.com", "a1")
+    pool.submit("a@x.com", "a2")  # Waits behind a1
+    pool.submit("b@x.com", "b1")
+    pool.close()
+
+    assert batches == [["a1", "b1"], ["a2"]]
+    assert stats["email_sent"] == 2 and stats["email_fail"] == 1
+    assert sorted(results) == [("a@x.com", False), ("a@x.com", True), ("b@x.com", True)]
@@ -0,0 +1,55 @@
+# test_brevo_batch.py
+import connections
+import services
+
+
+class FakeResponse:
+    headers = {}
+
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return {}
+
+
+def _send(monkeypatch, recipients, status_codes):
+    monkeypatch.setenv("BREVO_API_KEY", "test")
+    requests = []
+
+    def post(url, **kwargs):
+        requests.append(kwargs["json"])
+        return FakeResponse(status_codes.pop(0))
+
+    monkeypatch.setattr(connections, "post", post)
+    results = services.send_brevo_email_batch(recipients, "Update for {user_name}", "Hello\nthere")
+    return results, requests
+
+
+def test_html_is_sent_once_per_batch(monkeypatch):
+    recipients = [(f"user{i}@x.com", f"User {i}") for i in range(3)]
+    results, requests = _send(monkeypatch, recipients, [201])
+
+    assert results == [True, True, True]
+    payload = requests[0]
+    assert services.BREVO_NAME_PARAM in payload["htmlContent"]
+    assert payload["subject"] == f"Update for {services.BREVO_NAME_PARAM}"
+    assert payload["messageVersions"][1] == {
+        "to": [{"email": "user1@x.com", "name": "User 1"}],
+        "params": {"user_name": "User 1"},
+    }
+
+
+def test_invalid_address_fails_alone(monkeypatch):
+    results, requests = _send(monkeypatch, [("a@x.com", "A"), ("nope", "B")], [201])
+    assert results == [True, False]
+    assert len(requests[0]["messageVersions"]) == 1
+
+
+def test_rejected_batch_is_resent_one_by_one(monkeypatch):
+    results, requests = _send(monkeypatch, [("a@x.com", "A"), ("b@x.com", "B")], [400, 201, 400])
+    assert results == [True, False]
+    # The single sends are fully rendered and personalized
+    assert requests[1]["subject"] == "Update for A"
+    assert "A" in requests[1]["htmlContent"]
@@ -0,0 +1,40 @@
+# test_dedup.py
+import time
+import uuid
+from dedup import DedupIndex
+
+
+def test_second_delivery_is_dropped():
+    index = DedupIndex("test", ttl=60, max_size=10)
+    assert index.add_if_new("message:1") is True
+    assert index.add_if_new("message:1") is False
+
+
+def test_key_is_new_again_after_the_ttl():
+    index = DedupIndex("test", ttl=0.05, max_size=10)
+    assert index.add_if_new("message:1")
+    time.sleep(0.1)
+    assert index.add_if_new("message:1")
+
+
+def test_oldest_key_is_evicted_when_full():
+    index = DedupIndex("test", ttl=60, max_size=2)
+    for key in ("a", "b", "c"):
+        assert index.add_if_new(key)
+    assert len(index.entries) <= 2
+    assert index.add_if_new("a")  # Evicted, so it counts as new
+    assert not index.add_if_new("c")
+
+
+def test_persisted_keys_survive_a_restart():
+    name = f"test-{uuid.uuid4().hex}"
+    assert DedupIndex(name, ttl=60, max_size=10, persist=True).add_if_new("message:1")
+    # A fresh index (restarted worker) still finds it on disk
+    assert not DedupIndex(name, ttl=60, max_size=10, persist=True).add_if_new("message:1")
+
+
+def test_expired_persisted_keys_are_new_again():
+    name = f"test-{uuid.uuid4().hex}"
+    assert DedupIndex(name, ttl=0.05, max_size=10, persist=True).add_if_new("message:1")
+    time.sleep(0.1)
+    assert DedupIndex(name, ttl=0.05, max_size=10, persist=True).add_if_new("message:1")
@@ -0,0 +1,69 @@
+# test_delivery_status.py
+import time
+import uuid
+import delivery_status
+from delivery_status import blast_report, phone_history, record_sent, record_status
+
+
+def _wait_for_status(phone, status, timeout=5):
+    # Rows are written by the batching writer thread
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        history = phone_history(phone)
+        if history and history[0]["status"] == status:
+            return history[0]
+        time.sleep(0.02)
+    raise AssertionError(f"status {status!r} never written for {phone}")
+
+def _message():
+    return f"wamid.{uuid.uuid4().hex}", "91" + uuid.uuid4().hex[:10]
+
+
+def test_late_sent_callback_does_not_undo_delivered():
+    wamid, phone = _message()
+    record_sent(wamid, "blast-1", phone)
+    record_status(wamid, "delivered", phone)
+    _wait_for_status(phone, "delivered")
+    record_status(wamid, "sent", phone)
+    record_status(wamid, "read", phone)
+    row = _wait_for_status(phone, "read")
+    record_status(wamid, "delivered", phone)
+    time.sleep(delivery_status.STATUS_FLUSH_INTERVAL * 3)
+    assert phone_history(phone)[0]["status"] == "read"
+    assert row["blast_id"] == "blast-1"
+
+
+def test_out_of_order_rows_in_one_batch():
+    # Same batch, newest status first: the rank decides, not the order
+    wamid, phone = _message()
+    now = time.time()
+    rows = [
+        (wamid, "blast-2", phone, "read", delivery_status.STATUS_RANKS["read"], None, None, now, now),
+        (wamid, None, phone, "sent", delivery_status.STATUS_RANKS["sent"], None, None, None, now),
+        (wamid, None, phone, "delivered", delivery_status.STATUS_RANKS["delivered"], None, None, None, now),
+    ]
+    db = delivery_status._db()
+    with db:
+        db.executemany(delivery_status.UPSERT, rows)
+    assert phone_history(phone)[0]["status"] == "read"
+
+
+def test_failure_is_final_and_reported():
+    blast_id = f"blast-{uuid.uuid4().hex}"
+    wamid, phone = _message()
+    record_sent(wamid, blast_id, phone)
+    record_status(wamid, "failed", phone, 131026, "Message undeliverable")
+    _wait_for_status(phone, "failed")
+    record_status(wamid, "read", phone)
+    time.sleep(delivery_status.STATUS_FLUSH_INTERVAL * 3)
+
+    report = blast_report(blast_id)
+    assert report["by_status"]["failed"] == 1 and report["failure_rate"] == 1.0
+    assert report["top_errors"] == [{"code": 131026, "message": "Message undeliverable", "count": 1}]
+
+
+def test_unknown_status_is_ignored():
+    wamid, phone = _message()
+    record_status(wamid, "deleted", phone)
+    time.sleep(delivery_status.STATUS_FLUSH_INTERVAL * 2)
+    assert phone_history(phone) == []
@@ -0,0 +1,45 @@
+# test_intents.py
+from intents import IntentMatcher, merge_intents
+
+INTENTS = [
+    {"name": "greeting", "keywords": ["hi", "hello", "good morning"], "reply": "GREETING", "exact": True},
+    {"name": "pricing", "keywords": ["price", "how much"], "reply": "PRICING"},
+    {"name": "location", "keywords": ["where", "address"], "reply": "LOCATION"},
+    {"name": "services", "keywords": ["service", "what do you do"], "reply": "SERVICES"},
+]
+
+
+def _name(text, intents=INTENTS):
+    intent = IntentMatcher(intents).match(text)
+    return intent["name"] if intent else None
+
+
+def test_keywords_match_whole_words_only():
+    assert _name("Where is your office?") == "location"
+    assert _name("I can meet anywhere") is None
+    assert _name("nowhere near") is None
+
+
+def test_plural_still_matches():
+    assert _name("what are your prices") == "pricing"
+    assert _name("your services?") == "services"
+
+
+def test_higher_priority_intent_wins_on_overlap():
+    # "service" comes first in the text, but pricing has the higher priority
+    assert _name("service price") == "pricing"
+    assert _name("where can I see how much it costs") == "pricing"
+
+
+def test_greeting_only_matches_the_whole_message():
+    assert _name("Hello!") == "greeting"
+    assert _name("  good   morning ") == "greeting"
+    assert _name("hello, where is your office") == "location"
+    assert _name("hi there") is None
+
+
+def test_override_keeps_the_priority():
+    override = {"name": "pricing", "keywords": ["cost"], "reply": "NEW PRICING"}
+    merged = merge_intents(INTENTS, [override])
+    assert [i["name"] for i in merged] == ["greeting", "pricing", "location", "services"]
+    assert _name("where does it cost less", merged) == "pricing"
@@ -0,0 +1,62 @@
+# test_live_logs.py
+import pytest
+import app
+from logstore import LogStore
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+def _get(client, query):
+    return client.get(f"/api/get-live-logs?token={app.issue_log_token()}&{query}")
+
+
+@pytest.mark.parametrize("query", ["limit=-1", "limit=0", "limit=abc", "limit=1.5", "cursor=-3", "cursor=x"])
+def test_bad_cursor_or_limit_is_a_400(client, query):
+    assert _get(client, query).status_code == 400
+
+
+def test_huge_limit_is_clamped(client):
+    app.live_logs.append("test", "hello")
+    response = _get(client, "cursor=0&limit=99999999")
+    assert response.status_code == 200
+    assert response.json["logs"]
+
+
+def test_missing_token_is_refused(client):
+    assert client.get("/api/get-live-logs").status_code == 403
+
+
+def test_read_by_cursor_and_dropped_count():
+    store = LogStore(3)
+    for i in range(5):
+        store.append("test", f"event {i}")
+    events, cursor, dropped = store.read(0)
+    assert [e["message"] for e in events] == ["event 2", "event 3", "event 4"]
+    assert (cursor, dropped) == (5, 2)
+    assert store.read(cursor) == ([], 5, 0)
+    events, cursor, _ = store.read(2, limit=1)
+    assert [e["seq"] for e in events] == [3] and cursor == 3
+
+
+def test_per_recipient_events_cannot_push_out_failures():
+    store = LogStore(2, bulk_capacity=3, bulk_types={"recipient_result"})
+    store.append("delivery_failed", "blocked")
+    for i in range(10):
+        store.append("recipient_result", f"sent {i}")
+
+    events, cursor, dropped = store.read(0)
+    assert [e["message"] for e in events] == ["blocked", "sent 7", "sent 8", "sent 9"]
+    assert (cursor, dropped) == (11, 7)
+
+
+def test_limit_keeps_both_rings_in_seq_order():
+    store = LogStore(5, bulk_capacity=5, bulk_types={"recipient_result"})
+    for kind in ("recipient_result", "delivery_failed", "recipient_result", "blast_status"):
+        store.append(kind, kind)
+    events, cursor, dropped = store.read(0, limit=3)
+    assert [e["seq"] for e in events] == [1, 2, 3]
+    assert (cursor, dropped) == (3, 0)
+    events, cursor, _ = store.read(cursor)
+    assert [e["seq"] for e in events] == [4] and cursor == 4
@@ -0,0 +1,35 @@
+# test_llm_cache.py
+import pytest
+from llm_cache import SemanticCache, SEMANTIC_CACHE_THRESHOLD, _ngram_vector
+
+# Long shared phrase, one different key word: must never share an answer
+DIFFERENT_QUESTIONS = [
+    ("can you tell me the price of your logo design services",
+     "can you tell me the price of your website design services"),
+    ("can you tell me the price of your meta ads services for my restaurant",
+     "can you tell me the price of your google ads services for my restaurant"),
+]
+
+
+def _cache():
+    return SemanticCache(ttl=60, max_size=10, threshold=SEMANTIC_CACHE_THRESHOLD)
+
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_QUESTIONS)
+def test_key_word_change_is_a_miss(cached, asked):
+    cache = _cache()
+    cache.put(cached, "cached answer")
+    assert cache.get(asked) is None
+    assert cache.get(cached) == "cached answer"
+
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_QUESTIONS)
+def test_ngram_score_alone_cannot_tell_them_apart(cached, asked):
+    # Documents why the content word check exists
+    assert float(_ngram_vector(cached) @ _ngram_vector(asked)) >= 0.85
+
+
+def test_paraphrase_is_a_hit():
+    cache = _cache()
+    cache.put("do you do seo", "Yes, we do SEO")
+    assert cache.get("SEO, do you do?") == "Yes, we do SEO"
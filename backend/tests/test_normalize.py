@@ -0,0 +1,52 @@
+# test_normalize.py
+from normalize import build_send_plan, normalize_emails, normalize_phones
+
+
+def _row(phone="", email="", name=""):
+    return {"Phone": phone, "Email ids": email, "Name": name}
+
+
+def test_local_and_international_formats_dedupe():
+    assert normalize_phones(["098765-43210", "+91 98765 43210"]) == ["919876543210", "919876543210"]
+    plan = build_send_plan("Tab", [_row("098765-43210"), _row("+91 98765 43210")], set())
+    assert [r.phone for r in plan] == ["919876543210"]
+
+
+def test_dedupe_spans_tabs():
+    seen = set()
+    build_send_plan("Tab 1", [_row("9876543210", "a@x.com")], seen)
+    assert build_send_plan("Tab 2", [_row("+91-98765-43210", "A@X.com")], seen) == []
+
+
+def test_delhi_landline_is_dropped():
+    assert normalize_phones(["01123456789", "011-2345 6789"]) == [None, None]
+
+
+def test_ten_digits_starting_with_91_get_the_country_code():
+    assert normalize_phones(["9123456789"]) == ["919123456789"]
+
+
+def test_country_code_is_kept_and_plus_stripped():
+    assert normalize_phones(["+919876543210", "919876543210", "+44 7911 123456"]) == [
+        "919876543210", "919876543210", "447911123456",
+    ]
+
+
+def test_short_or_empty_phones_are_unusable():
+    assert normalize_phones(["12345", "", "n/a"]) == [None, None, None]
+
+
+def test_multi_address_email_cells_keep_the_first_address():
+    assert normalize_emails([
+        "a@x.com, b@y.com",
+        "a@x.com / b@y.com",
+        "A@X.com (Personal)",
+    ]) == ["a@x.com"] * 3
+
+
+def test_invalid_emails_are_unusable():
+    assert normalize_emails(["not an email", "", "a@b"]) == [None, None, None]
+
+
+def test_rows_without_phone_or_email_are_dropped():
+    assert build_send_plan("Tab", [_row(name="Nobody")], set()) == []
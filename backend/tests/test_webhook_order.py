@@ -0,0 +1,60 @@
+# test_webhook_order.py
+import threading
+import time
+import uuid
+import app
+
+
+def _payload(*messages):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": list(messages)}}]}],
+    }
+
+def _text(phone, body):
+    return {"id": uuid.uuid4().hex, "from": phone, "type": "text", "text": {"body": body}}
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_one_senders_replies_keep_their_order(monkeypatch):
+    replies = []
+
+    def slow_first_answer(user_text, phone=None):
+        if user_text == "first question":
+            time.sleep(0.3)  # The second message arrives while this LLM call is running
+        return f"answer to {user_text}"
+
+    monkeypatch.setattr(app, "get_groq_response", slow_first_answer)
+    monkeypatch.setattr(app, "send_whatsapp_text", lambda phone, text: replies.append((phone, text)))
+
+    phone = "91" + uuid.uuid4().hex[:10]
+    app.process_webhook(_payload(_text(phone, "first question"), _text(phone, "second question")))
+    _wait_for(lambda: len(replies) == 2)
+
+    assert replies == [(phone, "answer to first question"), (phone, "answer to second question")]
+
+
+def test_different_senders_still_run_in_parallel(monkeypatch):
+    started = []
+    both_started = threading.Event()
+
+    def answer(user_text, phone=None):
+        started.append(phone)
+        if len(started) == 2:
+            both_started.set()
+        # Only returns once the other sender's call is running too
+        assert both_started.wait(2), "senders were handled one after the other"
+        return "ok"
+
+    replies = []
+    monkeypatch.setattr(app, "get_groq_response", answer)
+    monkeypatch.setattr(app, "send_whatsapp_text", lambda phone, text: replies.append(phone))
+
+    app.process_webhook(_payload(_text("911000000001", "question"), _text("911000000002", "question")))
+    _wait_for(lambda: len(replies) == 2)
+
+    assert sorted(replies) == ["911000000001", "911000000002"]
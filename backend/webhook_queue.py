@@ -0,0 +1,88 @@
+# webhook_queue.py
+import os
+import queue
+import threading
+from collections import deque
+
+# --- CONFIGURATION ---
+# Worker threads that process webhook events (LLM calls + replies) in the background
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+# When this many events are waiting, new deliveries are refused (Meta retries them later)
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+
+_event_queue = queue.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+_workers = []
+_workers_lock = threading.Lock()
+
+# Events with a key (the sender's phone) run one at a time, in arrival order:
+# key -> deque of (payload, handler) waiting behind the event that is running
+_waiting = {}
+_waiting_lock = threading.Lock()
+
+
+def enqueue_event(payload, handler, key=None):
+    """
+    Queues handler(payload) for a background worker. Returns False if the queue is full.
+    Events with the same key never run in parallel and keep their order, so one sender's
+    messages are answered in order while different senders are still handled in parallel.
+    If the queue is full, a keyed event runs right away on the calling thread instead.
+    """
+    _start_workers()
+    if key is not None:
+        with _waiting_lock:
+            if key in _waiting:
+                # The worker running this key picks it up when it's done
+                _waiting[key].append((payload, handler))
+                return True
+            _waiting[key] = deque()
+    try:
+        _event_queue.put_nowait((payload, handler, key))
+        return True
+    except queue.Full:
+        if key is not None:
+            _run(payload, handler, key)
+            return True
+        print(f"⚠️ Webhook queue full ({WEBHOOK_QUEUE_SIZE} events), refusing delivery")
+        return False
+
+def queue_size():
+    with _waiting_lock:
+        waiting = sum(len(events) for events in _waiting.values())
+    return _event_queue.qsize() + waiting
+
+
+def _start_workers():
+    # Started lazily (after gunicorn has forked the worker process)
+    if len(_workers) >= WEBHOOK_WORKERS:
+        return
+    with _workers_lock:
+        while len(_workers) < WEBHOOK_WORKERS:
+            worker = threading.Thread(target=_work_forever, name=f"webhook-{len(_workers)}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+def _work_forever():
+    while True:
+        payload, handler, key = _event_queue.get()
+        try:
+            _run(payload, handler, key)
+        finally:
+            _event_queue.task_done()
+
+def _run(payload, handler, key):
+    """
+    Runs the event, then every event that queued up behind the same key meanwhile.
+    """
+    while True:
+        try:
+            handler(payload)
+        except Exception as e:
+            print(f"Webhook Error: {e}")
+        if key is None:
+            return
+        with _waiting_lock:
+            waiting = _waiting[key]
+            if not waiting:
+                del _waiting[key]
+                return
+            payload, handler = waiting.popleft()